@@ -0,0 +1,148 @@
+"""Action items as rows, for counting recurring requests across agents.
+
+Feedback.action_items stays a JSON array (it is what the API returns).
+Each item is also stored in action_items with a normalized key, so
+near-identical phrasings count together. "Send weekly updates." and
+"send weekly update" share a key, and so do "Follow up on the closing
+timeline" and "Closing timeline follow-up". The key is the item's
+content words, lowercased, stripped of punctuation and accents, crudely
+stemmed and sorted. Top-N questions are then one
+GROUP BY over an index that covers the time window, the agent and the
+key.
+"""
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from models import ActionItem, Agent, Feedback
+from feedback_views import parse_action_items
+
+STOPWORDS = frozenset(
+    "a an and any are as at be been but by client clients for from has have in into is it its more of on or our "
+    "so than that the their them they this to was were will with".split()
+)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 5 and word.endswith("ing"):
+        word = word[:-3]
+    elif len(word) > 4 and word.endswith("ed"):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    # update/updates/updated/updating all end up as "updat"
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def normalize_action_item(item: str) -> str:
+    ascii_text = unicodedata.normalize("NFKD", item).encode("ascii", "ignore").decode().lower()
+    words = {_stem(word) for word in _WORD.findall(ascii_text) if word not in STOPWORDS}
+    return " ".join(sorted(words))[:255]
+
+
+def action_item_rows(feedback_id: int, agent_id, created_at: datetime, action_items) -> List[dict]:
+    rows, seen = [], set()
+    for position, item in enumerate(parse_action_items(action_items)):
+        item = item.strip()
+        key = normalize_action_item(item)
+        # The same request twice in one feedback counts once
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        rows.append({
+            "feedback_id": feedback_id,
+            "agent_id": agent_id,
+            "position": position,
+            "text": item,
+            "normalized_key": key,
+            "created_at": created_at,
+        })
+    return rows
+
+
+def record_action_items(db: Session, feedback: Feedback):
+    """Index a new Feedback row's action items; call before committing, like rollups.record_feedback."""
+    if not feedback.action_items:
+        return
+    if feedback.id is None:
+        db.flush()
+    rows = action_item_rows(feedback.id, feedback.agent_id, feedback.created_at or datetime.utcnow(), feedback.action_items)
+    if rows:
+        db.execute(insert(ActionItem.__table__), rows)
+
+
+def backfill_action_items(connection: Connection, batch_size: int = 1000):
+    """Index action items of feedback that has none indexed yet (databases from before the table existed)."""
+    indexed = select(ActionItem.feedback_id)
+    query = (
+        select(Feedback.id, Feedback.agent_id, Feedback.created_at, Feedback.action_items)
+        .where(Feedback.action_items.isnot(None), Feedback.id.notin_(indexed))
+        .order_by(Feedback.id)
+    )
+    rows = []
+    for feedback_id, agent_id, created_at, action_items in connection.execution_options(yield_per=batch_size).execute(query):
+        rows.extend(action_item_rows(feedback_id, agent_id, created_at or datetime.utcnow(), action_items))
+        if len(rows) >= batch_size:
+            connection.execute(insert(ActionItem.__table__), rows)
+            rows = []
+    if rows:
+        connection.execute(insert(ActionItem.__table__), rows)
+
+
+def top_action_items(
+    db: Session,
+    days: int = 30,
+    agent_id: int = None,
+    brokerage: str = None,
+    group_by: str = None,
+    limit: int = 10,
+):
+    """Most frequent action items in the last `days`, overall or top `limit` per agent or brokerage."""
+    since = datetime.utcnow() - timedelta(days=days)
+    count = func.count(ActionItem.id)
+    columns = [
+        ActionItem.normalized_key.label("key"),
+        # Any phrasing will do as the label; min() keeps it stable between calls
+        func.min(ActionItem.text).label("item"),
+        count.label("count"),
+        func.count(func.distinct(ActionItem.agent_id)).label("agent_count"),
+    ]
+    group_columns = []
+    if group_by == "agent":
+        group_columns = [ActionItem.agent_id, Agent.name, Agent.brokerage]
+        columns += [ActionItem.agent_id.label("agent_id"), Agent.name.label("agent_name"), Agent.brokerage.label("brokerage")]
+    elif group_by == "brokerage":
+        group_columns = [Agent.brokerage]
+        columns += [Agent.brokerage.label("brokerage")]
+
+    query = select(*columns).where(ActionItem.created_at >= since)
+    if brokerage is not None or group_by is not None:
+        query = query.join(Agent, Agent.id == ActionItem.agent_id)
+    if agent_id is not None:
+        query = query.where(ActionItem.agent_id == agent_id)
+    if brokerage is not None:
+        query = query.where(Agent.brokerage == brokerage)
+    query = query.group_by(ActionItem.normalized_key, *group_columns)
+
+    if not group_columns:
+        rows = db.execute(query.order_by(count.desc(), ActionItem.normalized_key).limit(limit)).mappings().all()
+        return [dict(row) for row in rows]
+
+    # Top `limit` per group in the database rather than shipping every (group, key) pair back
+    ranked = query.add_columns(
+        func.row_number().over(partition_by=group_columns, order_by=(count.desc(), ActionItem.normalized_key)).label("rank")
+    ).subquery()
+    group_order = [ranked.c.brokerage, ranked.c.agent_name, ranked.c.agent_id] if group_by == "agent" else [ranked.c.brokerage]
+    rows = db.execute(
+        select(ranked).where(ranked.c.rank <= limit).order_by(*group_order, ranked.c.rank)
+    ).mappings().all()
+    return [{key: value for key, value in row.items() if key != "rank"} for row in rows]
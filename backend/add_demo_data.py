@@ -1,8 +1,9 @@
-cd backend && source venv/bin/activate && python add_demo_data.pyimport requests
+import os
+import requests
 import json
 
 # Your Render backend URL
-API_URL = "https://realtor-phone-call.onrender.com"
+API_URL = os.getenv("API_URL", "https://realtor-phone-call.onrender.com")
 
 # Create agents
 agents_data = [
@@ -18,25 +19,21 @@ clients_data = [
     {"name": "Robert Martinez", "phone": "+14155553456", "email": "robert.m@email.com"}
 ]
 
-# Create agents
-agent_ids = []
-for agent_data in agents_data:
-    response = requests.post(f"{API_URL}/agents/", json=agent_data)
-    if response.status_code == 200:
-        agent_ids.append(response.json()['id'])
-        print(f"✅ Created agent: {agent_data['name']}")
-    else:
-        print(f"❌ Failed to create agent: {response.text}")
+# Create agents and clients; re-running matches existing ones instead of duplicating them
+def bulk_upsert(path, records):
+    response = requests.post(f"{API_URL}{path}", json=records)
+    response.raise_for_status()
+    ids = []
+    for record, result in zip(records, response.json()["results"]):
+        if result["status"] == "invalid":
+            print(f"❌ Invalid record {record}: {result['error']}")
+        else:
+            print(f"✅ {result['status'].capitalize()}: {record['name']}")
+        ids.append(result["id"])
+    return ids
 
-# Create clients
-client_ids = []
-for client_data in clients_data:
-    response = requests.post(f"{API_URL}/clients/", json=client_data)
-    if response.status_code == 200:
-        client_ids.append(response.json()['id'])
-        print(f"✅ Created client: {client_data['name']}")
-    else:
-        print(f"❌ Failed to create client: {response.text}")
+agent_ids = bulk_upsert("/agents/bulk", agents_data)
+client_ids = bulk_upsert("/clients/bulk", clients_data)
 
 # Create calls
 calls_data = [
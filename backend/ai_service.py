@@ -1,75 +1,311 @@
-import os
+import copy
 import json
-import requests
-from openai import OpenAI
+import threading
+from tempfile import SpooledTemporaryFile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import IO, Dict, List, Tuple
 from config import settings
+from http_clients import get_http_session, get_openai_client, get_twilio_client
+from cache import ResultCache, analysis_cache_key, transcription_cache_key
+from llm_scheduler import LIVE, BACKFILL, chat_scheduler, transcription_scheduler
+from sentiment import local_analysis, local_analysis_batch, local_stats, needs_llm
+from metrics import analyses, stage_timer
+from tracing import get_logger
 
-client = OpenAI(api_key=settings.openai_api_key)
+ANALYSIS_MODEL = "gpt-3.5-turbo"
+TRANSCRIPTION_MODEL = "whisper-1"
+# Bump whenever the analysis prompt changes so cached results from the old prompt stop matching
+PROMPT_VERSION = "1"
+# Completion tokens reserved per transcript when budgeting against the tokens-per-minute limit
+ANALYSIS_OUTPUT_TOKENS = 250
 
-def analyze_feedback(transcript: str) -> dict:
-    prompt = f"""
-    Analyze the following conversation transcript from a real estate client feedback call.
+analysis_cache = ResultCache("analysis", f"{ANALYSIS_MODEL}:{PROMPT_VERSION}")
+transcription_cache = ResultCache("transcription", TRANSCRIPTION_MODEL)
 
-    Transcript: {transcript}
+log = get_logger("ai")
 
-    Extract the following in JSON format:
-    {{
+ANALYSIS_FIELDS = """{
       "overall_sentiment": "Positive/Negative/Neutral",
       "rating_estimate": number between 1-10,
       "summary": "Brief summary of the feedback",
       "action_items": ["list", "of", "action", "items"]
-    }}
+    }"""
+
+def fallback_analysis() -> dict:
+    return {
+        "overall_sentiment": "Neutral",
+        "rating_estimate": 5,
+        "summary": "Analysis failed",
+        "action_items": []
+    }
+
+class AnalysisError(ValueError):
+    """The model's response could not be parsed into an analysis."""
+
+def is_valid_analysis(result) -> bool:
+    return (
+        isinstance(result, dict)
+        and isinstance(result.get("overall_sentiment"), str)
+        and isinstance(result.get("rating_estimate"), (int, float))
+        and isinstance(result.get("summary"), str)
+        and isinstance(result.get("action_items"), list)
+    )
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; close enough for budgeting batches
+    return len(text) // 4 + 1
+
+def analyze_feedback(transcript: str, use_cache: bool = True, priority: int = LIVE, raise_on_failure: bool = False, allow_local: bool = True) -> dict:
+    local = None
+    if allow_local and settings.local_sentiment_enabled:
+        local = local_analysis(transcript)
+        if not needs_llm(local):
+            analyses.inc(source="local")
+            return local.analysis
+
+    result = _analyze_with_llm(transcript, use_cache, priority, raise_on_failure)
+    if local is not None and result != fallback_analysis():
+        local_stats.record_comparison(local, result)
+    return result
+
+def _analyze_with_llm(transcript: str, use_cache: bool, priority: int, raise_on_failure: bool) -> dict:
+    cache_key = analysis_cache_key(transcript, ANALYSIS_MODEL, PROMPT_VERSION)
+    if use_cache and settings.cache_enabled:
+        cached = analysis_cache.get(cache_key)
+        # Entries cached before results were validated may be malformed; ask the model again for those
+        if is_valid_analysis(cached):
+            analyses.inc(source="cache")
+            # Hand out a copy so callers can't mutate the shared cached entry
+            return copy.deepcopy(cached)
+
+    prompt = f"""
+    Analyze the following conversation transcript from a real estate client feedback call.
+
+    Transcript: {transcript}
+
+    Extract the following in JSON format:
+    {ANALYSIS_FIELDS}
 
     Return only the JSON.
     """
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    result_text = response.choices[0].message.content.strip()
+    with stage_timer("gpt_analysis"):
+        response = chat_scheduler.run(
+            lambda: get_openai_client().chat.completions.create(
+                model=ANALYSIS_MODEL,
+                messages=[{"role": "user", "content": prompt}]
+            ),
+            priority=priority,
+            estimated_tokens=estimate_tokens(prompt) + ANALYSIS_OUTPUT_TOKENS,
+        )
+    # content is None on refusals and some finish reasons; that's as unusable as bad JSON
+    result_text = (response.choices[0].message.content or "").strip()
     # Assume it's JSON
     try:
         result = json.loads(result_text)
+        # Valid JSON in the wrong shape is as unusable as invalid JSON
+        if not is_valid_analysis(result):
+            raise ValueError("response is not an analysis object")
+        # Only usable results are cached, so a bad answer is retried rather than served for the cache TTL
+        if settings.cache_enabled:
+            analysis_cache.set(cache_key, result)
+        analyses.inc(source="llm")
         return result
-    except:
-        return {
-            "overall_sentiment": "Neutral",
-            "rating_estimate": 5,
-            "summary": "Analysis failed",
-            "action_items": []
-        }
-
-def transcribe_audio(audio_url: str) -> str:
-    try:
-        print(f"Downloading audio from: {audio_url}")
-        
-        # Extract recording SID from URL
-        # URL format: https://api.twilio.com/2010-04-01/Accounts/AC.../Recordings/RE...
-        recording_sid = audio_url.split('/')[-1]
-        
-        # Use Twilio client to fetch recording
-        from twilio.rest import Client
-        twilio_client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
-        recording = twilio_client.recordings(recording_sid).fetch()
-        
-        # Get the recording content
-        # recording.uri is a relative path, need to make it a full URL
-        full_uri = f"https://api.twilio.com{recording.uri.replace('.json', '')}"
-        audio_response = requests.get(full_uri, auth=(settings.twilio_account_sid, settings.twilio_auth_token))
-        audio_response.raise_for_status()
+    except ValueError:
+        if raise_on_failure:
+            analyses.inc(source="error")
+            raise AnalysisError(f"Unusable analysis response: {result_text[:200]}")
+        analyses.inc(source="fallback")
+        return fallback_analysis()
+
+def pack_batches(items: List[Tuple[str, str]], max_tokens: int, max_items: int) -> List[List[Tuple[str, str]]]:
+    """Greedily group (id, transcript) pairs so each batch stays within the token budget."""
+    batches, current, current_tokens = [], [], 0
+    for item in items:
+        tokens = estimate_tokens(item[1])
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _analyze_batch(batch: List[Tuple[str, str]], priority: int) -> Dict[str, dict]:
+    # Positional ids keep the prompt short and stop the model echoing back arbitrary caller ids
+    payload = [{"id": str(index), "transcript": transcript} for index, (_, transcript) in enumerate(batch)]
+    prompt = f"""
+    Analyze each of the following conversation transcripts from real estate client feedback calls.
+
+    Transcripts (JSON): {json.dumps(payload)}
 
-        # Use a unique temp file to avoid race conditions
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_file.write(audio_response.content)
-            temp_filename = temp_file.name
+    For every transcript, extract the following in JSON format:
+    {ANALYSIS_FIELDS}
 
+    Return only a JSON object of the form {{"results": [{{"id": "<transcript id>", ...fields above...}}]}}
+    with exactly one result per transcript id.
+    """
+    with stage_timer("gpt_batch_analysis", batch_size=len(batch)):
+        response = chat_scheduler.run(
+            lambda: get_openai_client().chat.completions.create(
+                model=ANALYSIS_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+            ),
+            priority=priority,
+            estimated_tokens=estimate_tokens(prompt) + ANALYSIS_OUTPUT_TOKENS * len(batch),
+        )
+    results = {}
+    try:
+        entries = json.loads(response.choices[0].message.content).get("results", [])
+    except (ValueError, TypeError, AttributeError) as e:
+        log.warning("malformed batch analysis response", extra={"fields": {"error": str(e)}})
+        entries = []
+    for entry in entries if isinstance(entries, list) else []:
+        # A bad entry only costs its own transcript a single retry, not every entry after it
         try:
-            with open(temp_filename, "rb") as f:
-                transcript = client.audio.transcriptions.create(model="whisper-1", file=f)
-            return transcript.text
-        finally:
-            os.remove(temp_filename)
+            index = int(entry.pop("id"))
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            log.warning("malformed batch analysis entry", extra={"fields": {"error": f"{type(e).__name__}: {e}"}})
+            continue
+        if 0 <= index < len(batch) and is_valid_analysis(entry):
+            results[batch[index][0]] = entry
+    analyses.inc(len(results), source="llm")
+    return results
+
+def _analyze_single(transcript: str, priority: int) -> dict:
+    # One item's open circuit or exhausted retries must not discard the rest of the batch
+    try:
+        return analyze_feedback(transcript, use_cache=False, priority=priority, allow_local=False)
     except Exception as e:
-        print(f"Error transcribing audio: {e}")
-        return "Error: Could not transcribe audio"
\ No newline at end of file
+        log.warning("single analysis failed, returning the fallback", extra={"fields": {"error": f"{type(e).__name__}: {e}"}})
+        analyses.inc(source="error")
+        return {**fallback_analysis(), "error": f"Analysis unavailable: {e}"}
+
+def analyze_feedback_batch(items: List[Tuple[str, str]], use_cache: bool = True, priority: int = BACKFILL) -> Dict[str, dict]:
+    """Analyze many (id, transcript) pairs, packing them into as few LLM requests as possible.
+
+    Transcripts the local scorer is confident about, and cached ones, are answered
+    without a request; the rest are grouped into token-budgeted
+    batches that run concurrently. Any transcript whose batch result is missing or
+    malformed is retried on its own through analyze_feedback; if that fails too, the item
+    gets the fallback analysis plus an "error" message. Requests are scheduled
+    at backfill priority by default so they never delay live webhook analysis.
+    """
+    results = {}
+    pending = []
+    local_results = {}
+    if settings.local_sentiment_enabled:
+        for (item_id, transcript), local in zip(items, local_analysis_batch([transcript for _, transcript in items])):
+            if needs_llm(local):
+                local_results[item_id] = local
+            else:
+                analyses.inc(source="local")
+                results[item_id] = local.analysis
+        items = [(item_id, transcript) for item_id, transcript in items if item_id not in results]
+
+    for item_id, transcript in items:
+        cached = None
+        if use_cache and settings.cache_enabled:
+            cached = analysis_cache.get(analysis_cache_key(transcript, ANALYSIS_MODEL, PROMPT_VERSION))
+        if is_valid_analysis(cached):
+            analyses.inc(source="cache")
+            results[item_id] = copy.deepcopy(cached)
+        else:
+            pending.append((item_id, transcript))
+
+    batches = pack_batches(pending, settings.batch_max_tokens, settings.batch_max_items)
+    transcripts = dict(pending)
+    with ThreadPoolExecutor(max_workers=settings.batch_max_concurrency) as executor:
+        futures = {executor.submit(_analyze_batch, batch, priority): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                batch_results = future.result()
+            except Exception as e:
+                log.warning("batch analysis request failed, falling back to single requests", extra={"fields": {"error": str(e)}})
+                batch_results = {}
+            for item_id, result in batch_results.items():
+                results[item_id] = result
+                if settings.cache_enabled:
+                    analysis_cache.set(analysis_cache_key(transcripts[item_id], ANALYSIS_MODEL, PROMPT_VERSION), result)
+
+        missing = [item_id for item_id, _ in pending if item_id not in results]
+        for item_id, result in zip(missing, executor.map(lambda i: _analyze_single(transcripts[i], priority), missing)):
+            results[item_id] = result
+
+    for item_id, local in local_results.items():
+        if "error" not in results[item_id] and results[item_id] != fallback_analysis():
+            local_stats.record_comparison(local, results[item_id])
+    return results
+
+class RecordingTooLarge(ValueError):
+    pass
+
+# Bounds how many recordings are buffered and uploaded at once, so peak memory is
+# roughly audio_max_concurrency * audio_spool_max_bytes however many webhooks arrive
+audio_slots = threading.BoundedSemaphore(settings.audio_max_concurrency)
+
+def fetch_recording(audio_url: str) -> SpooledTemporaryFile:
+    """Stream a recording into a spooled buffer, positioned at the start.
+
+    Recordings up to audio_spool_max_bytes stay in memory; only unusually long
+    ones spill to a temp file. The caller must close the returned buffer.
+    """
+    log.info("downloading recording", extra={"fields": {"recording_url": audio_url}})
+
+    # Extract recording SID from URL
+    # URL format: https://api.twilio.com/2010-04-01/Accounts/AC.../Recordings/RE...
+    recording_sid = audio_url.split('/')[-1]
+
+    # Use the shared Twilio client to fetch recording
+    with stage_timer("twilio_recording_fetch", recording_sid=recording_sid):
+        recording = get_twilio_client().recordings(recording_sid).fetch()
+
+    # Get the recording content
+    # recording.uri is a relative path, need to make it a full URL
+    full_uri = f"{settings.twilio_api_base_url}{recording.uri.replace('.json', '')}"
+    with stage_timer("audio_download", recording_sid=recording_sid), get_http_session().get(
+        full_uri,
+        auth=(settings.twilio_account_sid, settings.twilio_auth_token),
+        timeout=(settings.http_connect_timeout_seconds, settings.http_timeout_seconds),
+        stream=True,
+    ) as audio_response:
+        audio_response.raise_for_status()
+        declared_size = int(audio_response.headers.get("Content-Length") or 0)
+        if declared_size > settings.audio_max_bytes:
+            raise RecordingTooLarge(f"Recording {recording_sid} is {declared_size} bytes (limit {settings.audio_max_bytes})")
+
+        buffer = SpooledTemporaryFile(max_size=settings.audio_spool_max_bytes, suffix=".wav")
+        try:
+            size = 0
+            for chunk in audio_response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > settings.audio_max_bytes:
+                    raise RecordingTooLarge(f"Recording {recording_sid} exceeds {settings.audio_max_bytes} bytes")
+                buffer.write(chunk)
+            buffer.seek(0)
+        except BaseException:
+            buffer.close()
+            raise
+    return buffer
+
+def transcribe_recording(audio: IO[bytes], priority: int = LIVE) -> str:
+    def upload():
+        # Rewind first so a retried upload sends the whole recording again
+        audio.seek(0)
+        # Upload straight from the buffer; the OpenAI client streams it in multipart chunks
+        return get_openai_client().audio.transcriptions.create(model=TRANSCRIPTION_MODEL, file=("recording.wav", audio))
+
+    with stage_timer("whisper"):
+        transcript = transcription_scheduler.run(upload, priority=priority)
+    return transcript.text
+
+def cached_transcription(recording_sid: str):
+    if not settings.cache_enabled or not recording_sid:
+        return None
+    cached = transcription_cache.get(transcription_cache_key(recording_sid))
+    return cached["text"] if cached is not None else None
+
+def cache_transcription(recording_sid: str, text: str):
+    if settings.cache_enabled and recording_sid:
+        transcription_cache.set(transcription_cache_key(recording_sid), {"text": text})
@@ -0,0 +1,133 @@
+"""Recording cleanup between download and transcription.
+
+Twilio's <Record> captures the pause before the caller starts talking and
+the timeout=5 of silence after they stop. Trimming that (and skipping
+answers that are silent throughout) cuts upload size, Whisper latency and
+billed audio minutes.
+"""
+import io
+import wave
+from typing import IO, NamedTuple
+
+import numpy as np
+from config import settings
+from tracing import get_logger
+
+FRAME_SECONDS = 0.03
+
+log = get_logger("audio")
+
+
+class PreprocessedAudio(NamedTuple):
+    audio: IO[bytes]
+    is_silent: bool
+    original_bytes: int
+    processed_bytes: int
+    original_seconds: float
+    processed_seconds: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.processed_bytes
+
+    @property
+    def seconds_saved(self) -> float:
+        return self.original_seconds - self.processed_seconds
+
+
+def _decode_pcm(frames: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """Decode PCM frames to mono float32 samples in [-1, 1]."""
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def _resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    # Only ever downsample: upsampling 8 kHz telephone audio would add bytes but no information
+    if rate <= target_rate or len(samples) == 0:
+        return samples
+    if rate % target_rate == 0:
+        # Integer ratio: average each block, which low-passes and decimates in one step
+        factor = rate // target_rate
+        usable = len(samples) - len(samples) % factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1)
+    duration = len(samples) / rate
+    target_times = np.arange(int(duration * target_rate)) / target_rate
+    return np.interp(target_times, np.arange(len(samples)) / rate, samples).astype(np.float32)
+
+
+def voiced_frames(samples: np.ndarray, rate: int) -> np.ndarray:
+    """Energy-based voice activity: one boolean per FRAME_SECONDS frame."""
+    frame_length = max(1, int(rate * FRAME_SECONDS))
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[: frame_count * frame_length].reshape(frame_count, frame_length)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    # Speech must clear both an absolute floor and the recording's own background noise.
+    # Capping below the loudest frame keeps answers with no pauses at all from reading as noise.
+    noise_floor = np.percentile(energy_db, 10)
+    adaptive = min(noise_floor + settings.vad_noise_margin_db, energy_db.max() - settings.vad_noise_margin_db)
+    threshold = max(settings.vad_threshold_db, adaptive)
+    return energy_db > threshold
+
+
+def _encode_wav(samples: np.ndarray, rate: int) -> io.BytesIO:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(pcm.tobytes())
+    output.seek(0)
+    return output
+
+
+def preprocess_recording(audio: IO[bytes]) -> PreprocessedAudio:
+    """Trim silence and downmix/downsample a WAV recording.
+
+    Audio that isn't PCM WAV is returned untouched so transcription still works.
+    """
+    audio.seek(0, io.SEEK_END)
+    original_bytes = audio.tell()
+    audio.seek(0)
+    try:
+        with wave.open(audio, "rb") as reader:
+            rate = reader.getframerate()
+            channels = reader.getnchannels()
+            sample_width = reader.getsampwidth()
+            samples = _decode_pcm(reader.readframes(reader.getnframes()), sample_width, channels)
+    except (wave.Error, EOFError, ValueError) as e:
+        log.info("skipping audio preprocessing, not a PCM WAV recording", extra={"fields": {"error": repr(e)}})
+        audio.seek(0)
+        return PreprocessedAudio(audio, False, original_bytes, original_bytes, 0.0, 0.0)
+
+    original_seconds = len(samples) / rate if rate else 0.0
+    voiced = voiced_frames(samples, rate)
+    frame_length = max(1, int(rate * FRAME_SECONDS))
+    if voiced.sum() * FRAME_SECONDS < settings.vad_min_speech_seconds:
+        return PreprocessedAudio(io.BytesIO(), True, original_bytes, 0, original_seconds, 0.0)
+
+    voiced_indices = np.flatnonzero(voiced)
+    padding = int(settings.vad_padding_seconds * rate)
+    start = max(0, voiced_indices[0] * frame_length - padding)
+    end = min(len(samples), (voiced_indices[-1] + 1) * frame_length + padding)
+
+    target_rate = min(rate, settings.audio_target_sample_rate)
+    trimmed = _resample(samples[start:end], rate, target_rate)
+    output = _encode_wav(trimmed, target_rate)
+    processed_bytes = output.getbuffer().nbytes
+    if processed_bytes >= original_bytes:
+        # e.g. 8-bit input with nothing to trim: re-encoding to 16-bit would only grow it
+        audio.seek(0)
+        return PreprocessedAudio(audio, False, original_bytes, original_bytes, original_seconds, original_seconds)
+    return PreprocessedAudio(output, False, original_bytes, processed_bytes, original_seconds, len(trimmed) / target_rate)
@@ -0,0 +1,152 @@
+"""Local stand-ins for the Twilio and OpenAI endpoints the backend calls.
+
+Run with uvicorn (run.py does this) and point TWILIO_API_BASE_URL and
+OPENAI_BASE_URL at it. Latency and failure behaviour come from the
+environment:
+
+    FAKE_TWILIO_LATENCY_MS   Twilio REST and recording downloads (default 80)
+    FAKE_CHAT_LATENCY_MS     chat completions (default 600)
+    FAKE_WHISPER_LATENCY_MS  transcriptions (default 900)
+    FAKE_JITTER              +/- fraction applied to every latency (default 0.3)
+    FAKE_ERROR_RATE          share of OpenAI requests that fail with 429/500 (default 0)
+    FAKE_RECORDING_SECONDS   length of the served recordings (default 6)
+"""
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import time
+import uuid
+import wave
+
+import numpy as np
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+TWILIO_LATENCY = float(os.getenv("FAKE_TWILIO_LATENCY_MS", "80")) / 1000
+CHAT_LATENCY = float(os.getenv("FAKE_CHAT_LATENCY_MS", "600")) / 1000
+WHISPER_LATENCY = float(os.getenv("FAKE_WHISPER_LATENCY_MS", "900")) / 1000
+JITTER = float(os.getenv("FAKE_JITTER", "0.3"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+RECORDING_SECONDS = float(os.getenv("FAKE_RECORDING_SECONDS", "6"))
+
+# What callers actually say: a mix the local scorer settles and ones it escalates
+ANSWERS = [
+    "It was great, thanks.",
+    "Amazing, she was super responsive and really knowledgeable.",
+    "Honestly it was fine but the closing got delayed twice and nobody told us why.",
+    "Not bad. I wish the listing photos had been better.",
+    "Terrible, he never called back and was rude to my wife.",
+    "Everything was perfect, I would recommend her to anyone.",
+    "Um, I don't know, it was okay I guess. The paperwork was confusing.",
+    "",
+]
+
+app = FastAPI(title="Fake Twilio and OpenAI")
+
+
+def _recording_wav() -> bytes:
+    # Telephone-quality recording: a second of line noise, speech-like tones, then trailing silence
+    rate = 8000
+    rng = np.random.default_rng(7)
+    t = np.arange(int(rate * RECORDING_SECONDS)) / rate
+    voiced = (t > 1.0) & (t < RECORDING_SECONDS - 2.0)
+    signal = rng.normal(0, 0.003, len(t)) + voiced * 0.3 * np.sin(2 * np.pi * 180 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes((np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes())
+    return output.getvalue()
+
+
+RECORDING = _recording_wav()
+
+
+async def _delay(seconds: float):
+    await asyncio.sleep(max(0.0, seconds * random.uniform(1 - JITTER, 1 + JITTER)))
+
+
+def _injected_error():
+    if random.random() >= ERROR_RATE:
+        return None
+    if random.random() < 0.5:
+        return JSONResponse({"error": {"message": "Rate limit reached", "type": "requests"}}, status_code=429, headers={"retry-after": "0.2"})
+    return JSONResponse({"error": {"message": "The server had an error", "type": "server_error"}}, status_code=500)
+
+
+# Twilio
+@app.post("/2010-04-01/Accounts/{account_sid}/Calls.json")
+async def create_call(account_sid: str):
+    await _delay(TWILIO_LATENCY)
+    return JSONResponse({"sid": f"CA{uuid.uuid4().hex}", "account_sid": account_sid, "status": "queued"}, status_code=201)
+
+
+@app.get("/2010-04-01/Accounts/{account_sid}/Recordings/{recording_sid}.json")
+async def fetch_recording_metadata(account_sid: str, recording_sid: str):
+    await _delay(TWILIO_LATENCY)
+    return {
+        "sid": recording_sid,
+        "account_sid": account_sid,
+        "duration": str(int(RECORDING_SECONDS)),
+        "uri": f"/2010-04-01/Accounts/{account_sid}/Recordings/{recording_sid}.json",
+    }
+
+
+@app.get("/2010-04-01/Accounts/{account_sid}/Recordings/{recording_sid}")
+async def download_recording(account_sid: str, recording_sid: str):
+    await _delay(TWILIO_LATENCY)
+    return Response(RECORDING, media_type="audio/x-wav")
+
+
+# OpenAI
+def _analysis() -> dict:
+    sentiment = random.choice(["Positive", "Positive", "Neutral", "Negative"])
+    return {
+        "overall_sentiment": sentiment,
+        "rating_estimate": {"Positive": 9, "Neutral": 6, "Negative": 3}[sentiment],
+        "summary": f"The client's feedback was mostly {sentiment.lower()}.",
+        "action_items": ["Follow up on closing timeline"] if sentiment != "Positive" else [],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    await _delay(CHAT_LATENCY)
+    error = _injected_error()
+    if error is not None:
+        return error
+
+    batch = re.search(r"Transcripts \(JSON\): (\[.*\])", prompt)
+    if batch:
+        ids = [item["id"] for item in json.loads(batch.group(1))]
+        content = json.dumps({"results": [{"id": item_id, **_analysis()} for item_id in ids]})
+    else:
+        content = json.dumps(_analysis())
+    prompt_tokens = len(prompt) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 80, "total_tokens": prompt_tokens + 80},
+    }
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    form = await request.form()
+    upload = form.get("file")
+    if upload is not None:
+        await upload.read()
+    await _delay(WHISPER_LATENCY)
+    error = _injected_error()
+    if error is not None:
+        return error
+    return {"text": random.choice(ANSWERS)}
@@ -0,0 +1,411 @@
+"""Offline benchmark for the API, with Twilio and OpenAI replaced by local fakes.
+
+    cd backend
+    python -m benchmarks.run --rate 20 --duration 15
+
+Starts benchmarks.fake_services and the app as uvicorn subprocesses,
+against a fresh SQLite database, and replays each scenario at a fixed
+arrival rate. Arrivals are open loop: a slow server can't slow the load
+down and hide its own latency, and latency is measured from when each
+request was due.
+
+The report covers requests, errors, throughput and p50/p95/p99 latency
+for /test-call, /webhook, /analyze and the list endpoints. It also
+covers how long the job workers take to drain the recordings the webhook
+scenario queued, and per-stage latencies scraped from /metrics.
+
+Results are written to benchmarks/results/ and compared with the
+previous run, or with --baseline, so regressions show up between
+versions. The directory is git-ignored: latencies only compare between
+runs on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SCENARIOS = ("test-call", "webhook", "analyze", "list")
+LIST_ENDPOINTS = ("/feedbacks/enriched?limit=50", "/clients/", "/agents/", "/calls/", "/stats/agents", "/stats/sentiment", "/jobs/")
+RECORDINGS_PER_CALL = 3
+# Results are only comparable when these were the same
+LOAD_ARGS = ("rate", "duration", "duplicate_rate", "twilio_latency_ms", "chat_latency_ms", "whisper_latency_ms", "error_rate", "app_env")
+# p95 changes smaller than this are treated as noise whatever the percentage
+NOISE_FLOOR_MS = 5.0
+
+TRANSCRIPTS = [
+    "Q: How was your experience working with Dana?\nA: It was great, thanks.",
+    "Q: How was your experience working with Dana?\nA: Amazing, she was super responsive.\n\n"
+    "Q: What did you like most about the experience?\nA: She really knew the neighborhood.",
+    "Q: Is there anything that could have been better?\nA: The closing got delayed twice and nobody told us why, "
+    "and I think the listing photos should have been redone.",
+    "Q: How was your experience working with Dana?\nA: Um, it was okay I guess. The paperwork was confusing.",
+    "Q: How was your experience working with Dana?\nA: Terrible, he never called back.",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> str:
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=BACKEND_DIR) != 0
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_server(target: str, port: int, env: dict, log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start within {timeout:.0f}s")
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize(samples, elapsed: float) -> dict:
+    latencies = sorted(latency * 1000 for latency, ok in samples if ok)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+async def open_loop(client: httpx.AsyncClient, requests_, rate: float):
+    """Send requests_[i] at start + i / rate regardless of how earlier ones are doing."""
+    loop = asyncio.get_running_loop()
+
+    async def send(request, due):
+        method, path, kwargs, key = request
+        try:
+            response = await client.request(method, path, **kwargs)
+            # /test-call reports Twilio failures as a 200 with an "error" field
+            ok = response.status_code < 400 and not (
+                response.headers.get("content-type", "").startswith("application/json") and "error" in response.json()
+            )
+        except httpx.HTTPError:
+            ok = False
+        return key, loop.time() - due, ok
+
+    start = loop.time()
+    tasks = []
+    for index, request in enumerate(requests_):
+        due = start + index / rate
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        tasks.append(asyncio.create_task(send(request, due)))
+    results = await asyncio.gather(*tasks)
+    return results, loop.time() - start
+
+
+async def seed(client: httpx.AsyncClient, calls: int, fake_url: str):
+    agents = []
+    for name, brokerage in [("Dana Reyes", "Harbor Realty"), ("Sam Ortiz", "Keystone Homes"), ("Lee Park", "Summit Group")]:
+        agents.append((await client.post("/agents/", json={"name": name, "brokerage": brokerage})).json()["id"])
+
+    async def make_call(index):
+        phone = f"+1555{index:07d}"
+        client_id = (await client.post("/clients/", json={"name": f"Client {index}", "phone": phone})).json()["id"]
+        sid = f"CA{uuid.uuid4().hex}"
+        await client.post("/calls/", json={"client_id": client_id, "agent_id": random.choice(agents), "twilio_sid": sid})
+        return sid
+
+    semaphore = asyncio.Semaphore(16)
+
+    async def bounded(index):
+        async with semaphore:
+            return await make_call(index)
+
+    return await asyncio.gather(*(bounded(i) for i in range(calls)))
+
+
+def webhook_deliveries(call_sids, fake_url: str, duplicate_rate: float):
+    """Three recording callbacks per call, in order, plus Twilio-style redeliveries of some of them."""
+    deliveries = []
+    started = datetime.now(timezone.utc)
+    for call_sid in call_sids:
+        for answer in range(RECORDINGS_PER_CALL):
+            recording_sid = f"RE{uuid.uuid4().hex}"
+            form = {
+                "CallSid": call_sid,
+                "RecordingSid": recording_sid,
+                "RecordingUrl": f"{fake_url}/2010-04-01/Accounts/ACbench/Recordings/{recording_sid}",
+                "RecordingStartTime": format_datetime(started + timedelta(seconds=20 * answer), usegmt=True),
+            }
+            deliveries.append(("POST", "/webhook", {"data": form}, "/webhook"))
+            if random.random() < duplicate_rate:
+                deliveries.append(("POST", "/webhook", {"data": dict(form)}, "/webhook"))
+    return deliveries
+
+
+async def wait_for_drain(client: httpx.AsyncClient, timeout: float) -> float:
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        pending = 0
+        for status in ("queued", "running"):
+            pending += len((await client.get("/jobs/", params={"status": status, "limit": 1})).json())
+        if pending == 0:
+            return time.monotonic() - started
+        await asyncio.sleep(0.25)
+    return float("nan")
+
+
+_SAMPLE = re.compile(r'^pipeline_stage_seconds_bucket\{stage="([^"]+)",outcome="ok",le="([^"]+)"\} (\d+)$')
+
+
+def stage_quantiles(metrics_text: str) -> dict:
+    """p50/p95 per pipeline stage from the /metrics histogram buckets, interpolated like histogram_quantile()."""
+    buckets = {}
+    for line in metrics_text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            stage, le, count = match.groups()
+            buckets.setdefault(stage, []).append((float("inf") if le == "+Inf" else float(le), int(count)))
+
+    def quantile(series, fraction):
+        total = series[-1][1]
+        target = fraction * total
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in series:
+            if count >= target:
+                if bound == float("inf"):
+                    return lower_bound
+                share = (target - lower_count) / (count - lower_count) if count > lower_count else 0.0
+                return lower_bound + (bound - lower_bound) * share
+            lower_bound, lower_count = bound, count
+        return lower_bound
+
+    return {
+        stage: {"count": series[-1][1], "p50_ms": round(quantile(series, 0.5) * 1000, 2), "p95_ms": round(quantile(series, 0.95) * 1000, 2)}
+        for stage, series in sorted(buckets.items())
+        if series[-1][1]
+    }
+
+
+async def run_scenarios(args, app_url: str, fake_url: str) -> dict:
+    results = {"scenarios": {}, "pipeline": {}}
+    total = max(1, int(args.rate * args.duration))
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.request_timeout, limits=limits) as client:
+        call_sids = await seed(client, math.ceil(total / RECORDINGS_PER_CALL), fake_url)
+
+        if "test-call" in args.scenarios:
+            requests_ = [("POST", "/test-call", {"data": {"phone_number": f"+1666{i:07d}"}}, "/test-call") for i in range(total)]
+            samples, elapsed = await open_loop(client, requests_, args.rate)
+            results["scenarios"]["/test-call"] = summarize([(latency, ok) for _, latency, ok in samples], elapsed)
+
+        if "webhook" in args.scenarios:
+            requests_ = webhook_deliveries(call_sids, fake_url, args.duplicate_rate)[:total]
+            started = time.monotonic()
+            samples, elapsed = await open_loop(client, requests_, args.rate)
+            results["scenarios"]["/webhook"] = summarize([(latency, ok) for _, latency, ok in samples], elapsed)
+            await wait_for_drain(client, args.drain_timeout)
+            drain = time.monotonic() - started
+            failed = len((await client.get("/jobs/", params={"status": "failed", "limit": 1000})).json())
+            feedback = sum(row["feedback_count"] for row in (await client.get("/stats/agents")).json())
+            results["pipeline"] = {
+                "recordings": len(requests_),
+                "feedback_created": feedback,
+                "failed_jobs": failed,
+                "seconds_to_drain": round(drain, 2),
+                "feedback_per_second": round(feedback / drain, 2) if drain else 0.0,
+            }
+
+        if "analyze" in args.scenarios:
+            requests_ = [("POST", "/analyze", {"json": {"transcript": random.choice(TRANSCRIPTS)}}, "/analyze") for _ in range(total)]
+            samples, elapsed = await open_loop(client, requests_, args.rate)
+            results["scenarios"]["/analyze"] = summarize([(latency, ok) for _, latency, ok in samples], elapsed)
+
+        if "list" in args.scenarios:
+            requests_ = [("GET", path, {}, path) for path in LIST_ENDPOINTS] * math.ceil(total / len(LIST_ENDPOINTS))
+            samples, elapsed = await open_loop(client, requests_[:total], args.rate)
+            for path in LIST_ENDPOINTS:
+                path_samples = [(latency, ok) for key, latency, ok in samples if key == path]
+                # Each endpoint only got its share of the arrivals, so throughput is per endpoint
+                results["scenarios"][f"GET {path}"] = summarize(path_samples, elapsed)
+
+        results["stages"] = stage_quantiles((await client.get("/metrics")).text)
+        results["analysis"] = (await client.get("/analyze/stats")).json()
+    return results
+
+
+def previous_result(exclude: Path = None):
+    candidates = sorted(p for p in RESULTS_DIR.glob("*.json") if p != exclude)
+    return candidates[-1] if candidates else None
+
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """Print a side-by-side table and return the scenarios that regressed."""
+    regressions = []
+    differing = [name for name in LOAD_ARGS if current["meta"]["args"].get(name) != baseline["meta"]["args"].get(name)]
+    if differing:
+        print(f"\nNot comparing with {baseline['meta']['revision']}: it ran with different {', '.join(differing)}")
+        return regressions
+    print(f"\nCompared with {baseline['meta']['revision']} ({baseline['meta']['timestamp']}):")
+    print(f"{'scenario':34} {'p95 ms':>16} {'change':>8} {'rps':>14}")
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        slower = change > threshold and now["p95_ms"] - before["p95_ms"] > NOISE_FLOOR_MS
+        fewer = before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - threshold)
+        flag = "  REGRESSION" if slower or fewer else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:34} {before['p95_ms']:>7.1f} -> {now['p95_ms']:<7.1f} {change:>+7.0%} "
+              f"{before['throughput_rps']:>6.1f} -> {now['throughput_rps']:<6.1f}{flag}")
+    return regressions
+
+
+def print_report(results: dict):
+    print(f"\n{'scenario':34} {'reqs':>6} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in results["scenarios"].items():
+        print(f"{name:34} {row['requests']:>6} {row['errors']:>5} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    if results["pipeline"]:
+        print("\npipeline:", json.dumps(results["pipeline"]))
+    if results["stages"]:
+        print(f"\n{'stage':34} {'count':>6} {'p50 ms':>9} {'p95 ms':>9}")
+        for stage, row in results["stages"].items():
+            print(f"{stage:34} {row['count']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rate", type=float, default=20.0, help="arrivals per second for each scenario")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of traffic per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="share of recording callbacks Twilio redelivers")
+    parser.add_argument("--twilio-latency-ms", type=float, default=80.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=600.0)
+    parser.add_argument("--whisper-latency-ms", type=float, default=900.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake OpenAI requests that fail with 429/500")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="extra settings for the app")
+    parser.add_argument("--drain-timeout", type=float, default=300.0)
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--max-connections", type=int, default=512)
+    parser.add_argument("--baseline", type=Path, help="result file to compare with (default: the latest in results/)")
+    parser.add_argument("--regression-threshold", type=float, default=0.2, help="relative p95/throughput change that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="realtor-bench-"))
+    fake_port, app_port = free_port(), free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+
+    fake_env = {
+        **os.environ,
+        "FAKE_TWILIO_LATENCY_MS": str(args.twilio_latency_ms),
+        "FAKE_CHAT_LATENCY_MS": str(args.chat_latency_ms),
+        "FAKE_WHISPER_LATENCY_MS": str(args.whisper_latency_ms),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+    }
+    app_env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "TWILIO_ACCOUNT_SID": "ACbench",
+        "TWILIO_AUTH_TOKEN": "bench",
+        "TWILIO_API_BASE_URL": fake_url,
+        "WEBHOOK_BASE_URL": app_url,
+        "LOG_LEVEL": "warning",
+        # Measure the app, not our OpenAI account's Whisper quota
+        "OPENAI_TRANSCRIPTION_RPM": "6000",
+    }
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        app_env[key] = value
+
+    fake = start_server("benchmarks.fake_services:app", fake_port, fake_env, workdir / "fake.log")
+    app = start_server("main:app", app_port, app_env, workdir / "app.log")
+    try:
+        wait_ready(f"{fake_url}/docs", fake)
+        wait_ready(f"{app_url}/", app)
+        results = asyncio.run(run_scenarios(args, app_url, fake_url))
+    finally:
+        for process in (app, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    results["meta"] = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()},
+        "logs": str(workdir),
+    }
+    print_report(results)
+
+    output = None
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{results['meta']['revision']}.json"
+        output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nSaved {output.relative_to(BACKEND_DIR)}")
+
+    baseline_path = args.baseline or previous_result(exclude=output)
+    if baseline_path is not None:
+        regressions = compare(results, json.loads(Path(baseline_path).read_text()), args.regression_threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Cold-start benchmark: import time and time to first request.
+
+    cd backend
+    python -m benchmarks.startup --runs 5 --compare HEAD~1
+
+Each run is a fresh interpreter, as on a Render cold start. It measures
+`import main`, and the time from launching uvicorn to the first
+successful GET /. The database is migrated before the timed runs, as a
+deploy would do. --compare measures another revision too, checked out
+into a temporary git worktree, so the two can be read side by side.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.run import BACKEND_DIR, free_port
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def base_env(workdir: Path) -> dict:
+    env = {key: value for key, value in os.environ.items() if key not in ("OPENAI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN")}
+    env.update({"DATABASE_URL": f"sqlite:///{workdir / 'startup.db'}", "LOG_LEVEL": "warning"})
+    return env
+
+
+def with_credentials(env: dict) -> dict:
+    return {**env, "OPENAI_API_KEY": "sk-bench", "TWILIO_ACCOUNT_SID": "ACbench", "TWILIO_AUTH_TOKEN": "bench"}
+
+
+def import_seconds(backend: Path, env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=backend, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def first_request_seconds(backend: Path, env: dict, timeout: float = 60.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=backend, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        raise RuntimeError(f"no response within {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def imports_without_credentials(backend: Path, env: dict) -> bool:
+    return subprocess.run([sys.executable, "-c", "import main"], cwd=backend, env=env, capture_output=True).returncode == 0
+
+
+def measure(label: str, backend: Path, runs: int) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="realtor-startup-"))
+    env = base_env(workdir)
+    # Untimed: compiles bytecode and brings the schema up to date, as a deploy would
+    if (backend / "migrations.py").exists() and "def migrate(" in (backend / "migrations.py").read_text():
+        subprocess.run([sys.executable, "migrations.py"], cwd=backend, env=with_credentials(env), capture_output=True, check=True)
+    import_seconds(backend, with_credentials(env))
+
+    imports = [import_seconds(backend, with_credentials(env)) for _ in range(runs)]
+    first_requests = [first_request_seconds(backend, with_credentials(env)) for _ in range(runs)]
+    return {
+        "label": label,
+        "import_ms": round(statistics.median(imports) * 1000, 1),
+        "first_request_ms": round(statistics.median(first_requests) * 1000, 1),
+        "imports_without_credentials": imports_without_credentials(backend, env),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement; the median is reported")
+    parser.add_argument("--compare", metavar="REV", help="git revision to measure alongside the working tree")
+    args = parser.parse_args(argv)
+
+    rows = []
+    worktree = None
+    try:
+        if args.compare:
+            worktree = Path(tempfile.mkdtemp(prefix="realtor-rev-")) / "tree"
+            subprocess.run(["git", "worktree", "add", "--detach", str(worktree), args.compare], cwd=BACKEND_DIR, capture_output=True, check=True)
+            rows.append(measure(args.compare, worktree / BACKEND_DIR.name, args.runs))
+        rows.append(measure("working tree", BACKEND_DIR, args.runs))
+    finally:
+        if worktree is not None:
+            subprocess.run(["git", "worktree", "remove", "--force", str(worktree)], cwd=BACKEND_DIR, capture_output=True)
+
+    print(f"\n{'revision':16} {'import main':>12} {'first request':>14} {'imports w/o keys':>17}")
+    for row in rows:
+        print(f"{row['label']:16} {row['import_ms']:>10.0f}ms {row['first_request_ms']:>12.0f}ms {str(row['imports_without_credentials']):>17}")
+
+
+if __name__ == "__main__":
+    main()
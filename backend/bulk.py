@@ -0,0 +1,174 @@
+"""Bulk upserts of clients and agents for CRM syncs and demo loads.
+
+Requests carry a JSON array or NDJSON, one record per line. NDJSON is
+read incrementally, so a 50k-row upload is never held as one parsed
+document. Records are validated and written in batches of
+bulk_batch_size. Each batch runs in one transaction:
+- one SELECT finds existing rows by natural key (phone for clients,
+  name and brokerage for agents);
+- one multi-row INSERT ... RETURNING adds the new ones;
+- one executemany UPDATE touches only rows whose fields changed.
+Every record gets a result: created, updated, unchanged, duplicate (a
+later record in the same batch has the same key) or invalid.
+"""
+import json
+from typing import AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from database import SessionLocal
+from models import Agent, Client
+from schemas import AgentCreate, ClientCreate
+from rollups import bump_versions
+from config import settings
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonlines", "application/jsonl")
+
+
+class BulkFormatError(ValueError):
+    pass
+
+
+def _error_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'record'}: {e['msg']}" for e in error.errors())
+
+
+def _upsert(db: Session, model, schema: type, key_fields: Tuple[str, ...], batch: List[Tuple[int, object]]) -> List[dict]:
+    results: Dict[int, dict] = {}
+    latest: Dict[tuple, Tuple[int, dict, dict]] = {}
+    for index, raw in batch:
+        if isinstance(raw, BulkFormatError):
+            results[index] = {"index": index, "status": "invalid", "error": str(raw)}
+            continue
+        if not isinstance(raw, dict):
+            results[index] = {"index": index, "status": "invalid", "error": "record must be a JSON object"}
+            continue
+        try:
+            record = schema(**raw)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "invalid", "error": _error_message(e)}
+            continue
+        values = {field: value.strip() if isinstance(value, str) else value for field, value in record.dict().items()}
+        # Fields left out of a record keep their stored value on update
+        provided = {field: values[field] for field in record.dict(exclude_unset=True)}
+        key = tuple(values[field] for field in key_fields)
+        if key in latest:
+            results[latest[key][0]] = {"index": latest[key][0], "status": "duplicate", "key": key}
+        latest[key] = (index, values, provided)
+
+    if latest:
+        key_columns = [getattr(model, field) for field in key_fields]
+        lookup = key_columns[0].in_([key[0] for key in latest]) if len(key_columns) == 1 else tuple_(*key_columns).in_(list(latest))
+        existing = {}
+        for row in db.execute(select(model).where(lookup).order_by(model.id)).scalars():
+            # Keys that aren't unique in the table (agents) match their oldest row
+            existing.setdefault(tuple(getattr(row, field) for field in key_fields), row)
+
+        new = [(key, index, values) for key, (index, values, _) in latest.items() if key not in existing]
+        if new:
+            inserted = db.execute(
+                insert(model).returning(model.id, sort_by_parameter_order=True), [values for _, _, values in new]
+            ).scalars().all()
+            for (key, index, _), row_id in zip(new, inserted):
+                results[index] = {"index": index, "status": "created", "id": row_id, "key": key}
+
+        changes = []
+        for key, row in existing.items():
+            index, _, provided = latest[key]
+            changed = {field: value for field, value in provided.items() if getattr(row, field) != value}
+            if changed:
+                changes.append({"id": row.id, **changed})
+            results[index] = {"index": index, "status": "updated" if changed else "unchanged", "id": row.id, "key": key}
+        # Grouped by column set so each group is one executemany UPDATE
+        for columns in {tuple(sorted(change)) for change in changes}:
+            db.execute(update(model), [change for change in changes if tuple(sorted(change)) == columns])
+        if new or changes:
+            bump_versions(db, model.__tablename__)
+        db.commit()
+
+    for result in results.values():
+        key = result.pop("key", None)
+        if result["status"] == "duplicate":
+            result["id"] = results[latest[key][0]].get("id")
+            result["error"] = f"superseded by record {latest[key][0]}"
+    return [results[index] for index, _ in batch]
+
+
+def upsert_clients(db: Session, batch) -> List[dict]:
+    return _upsert(db, Client, ClientCreate, ("phone",), batch)
+
+
+def upsert_agents(db: Session, batch) -> List[dict]:
+    return _upsert(db, Agent, AgentCreate, ("name", "brokerage"), batch)
+
+
+def run_batch(upsert, batch) -> List[dict]:
+    db = SessionLocal()
+    try:
+        try:
+            return upsert(db, batch)
+        except IntegrityError:
+            # Another sync inserted one of these keys between our SELECT and INSERT; it exists now
+            db.rollback()
+            return upsert(db, batch)
+    finally:
+        db.close()
+
+
+async def read_batches(request: Request) -> AsyncIterator[List[Tuple[int, object]]]:
+    """(index, record) batches from a JSON array or NDJSON body; unparseable NDJSON lines become BulkFormatError records."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    batch, count = [], 0
+
+    def add(record):
+        nonlocal count
+        count += 1
+        if count > settings.bulk_max_records:
+            raise BulkFormatError(f"At most {settings.bulk_max_records} records per request")
+        batch.append((count - 1, record))
+
+    if content_type in NDJSON_TYPES:
+        pending = b""
+        async for chunk in request.stream():
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    add(_parse_line(line))
+                # Per line, not per chunk: one network chunk can hold many batches' worth of records
+                if len(batch) >= settings.bulk_batch_size:
+                    yield batch
+                    batch = []
+        if pending.strip():
+            add(_parse_line(pending))
+    else:
+        try:
+            records = json.loads(await request.body())
+        except ValueError as e:
+            raise BulkFormatError(f"Body is not valid JSON: {e}")
+        if not isinstance(records, list):
+            raise BulkFormatError("Body must be a JSON array of records, or NDJSON with Content-Type application/x-ndjson")
+        for record in records:
+            add(record)
+            if len(batch) >= settings.bulk_batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return BulkFormatError(f"Invalid JSON: {e}")
+
+
+def summarize(results: List[dict]) -> dict:
+    counts = {status: 0 for status in ("created", "updated", "unchanged", "duplicate", "invalid")}
+    for result in results:
+        counts[result["status"]] += 1
+    return {**counts, "results": results}
@@ -0,0 +1,163 @@
+"""Two-tier cache for analysis and transcription results.
+
+Tier one is an in-process LRU with a TTL; tier two is the cached_results
+table, so results survive restarts and are shared between workers.
+Analysis keys include the model and PROMPT_VERSION, so changing either
+misses naturally; purge_stale() then removes the dead rows.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models import CachedResult
+from config import settings
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResultCache:
+    def __init__(self, kind: str, version: str = ""):
+        self.kind = kind
+        self.version = version
+        self.memory = TTLCache(settings.cache_max_entries, settings.cache_ttl_seconds)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        db = SessionLocal()
+        try:
+            row = db.get(CachedResult, key)
+            if row is not None and (row.expires_at is None or row.expires_at > datetime.utcnow()):
+                value = json.loads(row.value)
+        finally:
+            db.close()
+
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("db_hits")
+        self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value):
+        self.memory.set(key, value)
+        expires_at = datetime.utcnow() + timedelta(seconds=settings.cache_db_ttl_seconds)
+        db = SessionLocal()
+        try:
+            row = db.get(CachedResult, key)
+            if row is None:
+                row = CachedResult(key=key, kind=self.kind)
+                db.add(row)
+            row.value = json.dumps(value)
+            row.version = self.version
+            row.expires_at = expires_at
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same result first
+            db.rollback()
+        finally:
+            db.close()
+
+    def invalidate(self) -> int:
+        """Drop every entry of this kind from both tiers."""
+        self.memory.discard()
+        db = SessionLocal()
+        try:
+            count = db.query(CachedResult).filter(CachedResult.kind == self.kind).delete(synchronize_session=False)
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+    def purge_stale(self) -> int:
+        """Delete rows written under another version, or past their expiry."""
+        db = SessionLocal()
+        try:
+            count = db.query(CachedResult).filter(
+                CachedResult.kind == self.kind,
+                (CachedResult.version != self.version) | (CachedResult.expires_at < datetime.utcnow()),
+            ).delete(synchronize_session=False)
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "kind": self.kind,
+            "version": self.version,
+            "memory_entries": len(self.memory),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else None,
+        }
+
+
+def normalize_transcript(transcript: str) -> str:
+    return re.sub(r"\s+", " ", transcript).strip().lower()
+
+
+def analysis_cache_key(transcript: str, model: str, prompt_version: str) -> str:
+    digest = hashlib.sha256(f"{model}\0{prompt_version}\0{normalize_transcript(transcript)}".encode()).hexdigest()
+    return f"analysis:{digest}"
+
+
+def transcription_cache_key(recording_sid: str) -> str:
+    return f"transcription:{recording_sid}"
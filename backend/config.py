@@ -1,14 +1,128 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 import os
 
 class Settings(BaseSettings):
-    openai_api_key: str
-    twilio_account_sid: str
-    twilio_auth_token: str
+    # Checked when a client is first created (see require()), so modules import without credentials
+    openai_api_key: str = ""
+    twilio_account_sid: str = ""
+    twilio_auth_token: str = ""
     twilio_phone_number: str = "+1234567890"
     webhook_base_url: str = os.getenv("WEBHOOK_BASE_URL", "https://nonlactic-unvenerative-elisha.ngrok-free.dev")
+    # Point these at local stand-ins (see benchmarks/) to run without real Twilio/OpenAI accounts
+    twilio_api_base_url: str = "https://api.twilio.com"
+    openai_base_url: Optional[str] = None
+
+    # SQLite by default; set to a postgresql:// URL for a pooled Postgres server
+    database_url: str = "sqlite:///./test.db"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 64 * 1024
+    sqlite_mmap_size_bytes: int = 256 * 1024 * 1024
+
+    # Background processing of recording callbacks
+    job_worker_concurrency: int = 2
+    job_max_attempts: int = 5
+    job_retry_base_seconds: float = 5.0
+    job_poll_interval_seconds: float = 2.0
+    # A running job untouched for this long is taken to belong to a dead process and is re-queued
+    job_lease_seconds: float = 900.0
+    # Analyze a call with the answers received so far if no new recording arrives for this long
+    segment_timeout_seconds: float = 300.0
+
+    # Shared keep-alive connection pools for Twilio and OpenAI
+    http_pool_size: int = 10
+    http_pool_connections: int = 4
+    http_timeout_seconds: float = 60.0
+    http_connect_timeout_seconds: float = 5.0
+    http_keepalive_seconds: float = 30.0
+    http2_enabled: bool = True
+    # Worker threads for sync endpoints; async handlers (webhooks, test-call) stay on the event loop
+    threadpool_size: int = 40
+
+    # Recording buffers: kept in memory up to the spool size, rejected above the max
+    audio_spool_max_bytes: int = 5 * 1024 * 1024
+    audio_max_bytes: int = 25 * 1024 * 1024  # Whisper's upload limit
+    audio_max_concurrency: int = 2
+
+    # Silence trimming before transcription (energies in dBFS)
+    audio_preprocessing_enabled: bool = True
+    audio_target_sample_rate: int = 16000
+    vad_threshold_db: float = -45.0
+    vad_noise_margin_db: float = 6.0
+    vad_min_speech_seconds: float = 0.3
+    vad_padding_seconds: float = 0.25
+
+    # Analysis/transcription result cache: in-process LRU backed by the cached_results table
+    cache_enabled: bool = True
+    cache_max_entries: int = 2048
+    cache_ttl_seconds: float = 3600.0
+    cache_db_ttl_seconds: float = 30 * 24 * 3600.0
+
+    # Serialized list/stats responses keyed by table versions (response_cache.py); larger bodies get an ETag but aren't kept
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 512
+    response_cache_ttl_seconds: float = 600.0
+    response_cache_max_body_bytes: int = 1024 * 1024
+
+    # /analyze/batch packing: transcripts per LLM request and concurrent requests
+    batch_max_tokens: int = 6000
+    batch_max_items: int = 20
+    batch_max_concurrency: int = 4
+
+    # Local lexicon scorer (sentiment.py); only transcripts it is unsure about go to the LLM
+    local_sentiment_enabled: bool = True
+    local_sentiment_confidence_threshold: float = 0.6
+    local_sentiment_max_words: int = 40  # longer answers usually carry action items worth a summary
+    local_sentiment_shadow_rate: float = 0.0  # share of confident results also sent to the LLM to measure agreement
+
+    # OpenAI rate-limit budgets and retry policy (see llm_scheduler.py)
+    openai_chat_rpm: int = 3500
+    openai_chat_tpm: int = 90000
+    openai_transcription_rpm: int = 50
+    llm_max_concurrency: int = 8
+    llm_max_retries: int = 5
+    llm_backoff_base_seconds: float = 1.0
+    llm_backoff_max_seconds: float = 60.0
+    llm_circuit_failure_threshold: int = 5
+    llm_circuit_reset_seconds: float = 30.0
+
+    # Apply pending schema migrations at startup; turn off where `python migrations.py` runs at deploy time
+    db_auto_migrate: bool = True
+
+    # /clients/bulk and /agents/bulk: records per transaction, and per request
+    bulk_batch_size: int = 1000
+    bulk_max_records: int = 100_000
+
+    # Structured logs: "json" for log aggregation, "text" for a terminal
+    log_format: str = "json"
+    log_level: str = "info"
+
+    # /events Server-Sent Events stream
+    events_queue_size: int = 100
+    events_history_size: int = 256
+    events_heartbeat_seconds: float = 15.0
+
+    # Campaign dialer pacing and calling-window defaults
+    dialer_calls_per_second: float = 1.0
+    dialer_max_live_calls: int = 5
+    dialer_poll_interval_seconds: float = 1.0
+    dialer_live_call_timeout_seconds: float = 900.0
+    campaign_timezone: str = "America/New_York"
+    campaign_window_start_hour: int = 9
+    campaign_window_end_hour: int = 20
+    campaign_max_attempts: int = 3
+    campaign_retry_delay_minutes: float = 60.0
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+    def require(self, *names: str):
+        missing = [name.upper() for name in names if not getattr(self, name)]
+        if missing:
+            raise RuntimeError(f"Missing required setting(s): {', '.join(missing)} (set them in the environment or .env)")
+
+settings = Settings()
@@ -0,0 +1,267 @@
+"""Paced outbound dialer for feedback campaigns.
+
+A single background thread places queued CampaignCalls through Twilio no
+faster than dialer_calls_per_second, keeps at most dialer_max_live_calls
+ringing or in progress, only dials inside each client's local calling
+window and re-queues no-answers with exponential backoff. Call outcomes
+arrive on the /call-status webhook and are applied with record_call_status.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from database import SessionLocal
+from models import Campaign, CampaignCall, Call
+from http_clients import get_twilio_client
+from llm_scheduler import TokenBucket
+from twiml import generate_twiml
+from tracing import get_logger
+from config import settings
+
+log = get_logger("dialer")
+
+LIVE_STATUSES = ("dialing", "in_progress")
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+# Twilio CallStatus values that mean nobody took part in the survey
+RETRYABLE_OUTCOMES = ("busy", "no-answer", "failed", "canceled")
+
+
+def valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def calling_window(campaign_call: CampaignCall):
+    campaign = campaign_call.campaign
+    timezone = campaign_call.timezone or campaign.timezone
+    start = campaign_call.window_start_hour if campaign_call.window_start_hour is not None else campaign.window_start_hour
+    end = campaign_call.window_end_hour if campaign_call.window_end_hour is not None else campaign.window_end_hour
+    return ZoneInfo(timezone), start, end
+
+
+def next_window_opening(campaign_call: CampaignCall, now: datetime = None):
+    """Return None if the client may be called now, else the UTC time their window next opens."""
+    now = now or datetime.utcnow()
+    zone, start, end = calling_window(campaign_call)
+    local = now.replace(tzinfo=ZoneInfo("UTC")).astimezone(zone)
+    if start <= local.hour < end:
+        return None
+    opening = local.replace(hour=start, minute=0, second=0, microsecond=0)
+    if local.hour >= end:
+        opening += timedelta(days=1)
+    return opening.astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
+
+
+def live_call_count(db: Session) -> int:
+    # Calls whose status callback never arrived stop counting against the limit eventually
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.dialer_live_call_timeout_seconds)
+    return db.query(CampaignCall).filter(
+        CampaignCall.status.in_(LIVE_STATUSES), CampaignCall.updated_at >= cutoff
+    ).count()
+
+
+def expire_stale_calls(db: Session) -> int:
+    """Retry (or fail) live calls whose status callback never arrived within dialer_live_call_timeout_seconds."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.dialer_live_call_timeout_seconds)
+    stale = (
+        db.query(CampaignCall)
+        .options(joinedload(CampaignCall.campaign))
+        .filter(CampaignCall.status.in_(LIVE_STATUSES), CampaignCall.updated_at < cutoff)
+        .all()
+    )
+    for campaign_call in stale:
+        schedule_retry(campaign_call, "timeout", "No status callback received")
+    if stale:
+        db.flush()
+        for campaign_id in {campaign_call.campaign_id for campaign_call in stale}:
+            finish_campaign_if_done(db, campaign_id)
+        db.commit()
+    return len(stale)
+
+
+def schedule_retry(campaign_call: CampaignCall, outcome: str, error: str = None):
+    campaign = campaign_call.campaign
+    campaign_call.last_outcome = outcome
+    campaign_call.last_error = error
+    if campaign_call.attempts >= campaign.max_attempts:
+        campaign_call.status = "failed"
+        return
+    delay = campaign.retry_delay_minutes * (2 ** (campaign_call.attempts - 1))
+    campaign_call.status = "queued"
+    campaign_call.next_attempt_at = datetime.utcnow() + timedelta(minutes=delay)
+
+
+def finish_campaign_if_done(db: Session, campaign_id: int):
+    remaining = db.query(CampaignCall).filter(
+        CampaignCall.campaign_id == campaign_id, CampaignCall.status.notin_(TERMINAL_STATUSES)
+    ).count()
+    if remaining == 0:
+        campaign = db.get(Campaign, campaign_id)
+        if campaign.status == "active":
+            campaign.status = "completed"
+            campaign.completed_at = datetime.utcnow()
+
+
+def record_call_status(db: Session, call_sid: str, call_status: str) -> bool:
+    """Apply a Twilio status callback to its campaign call, if it belongs to one."""
+    campaign_call = db.query(CampaignCall).filter(CampaignCall.call_sid == call_sid).first()
+    if campaign_call is None or campaign_call.status not in LIVE_STATUSES:
+        return False
+
+    if call_status in ("ringing", "in-progress"):
+        campaign_call.status = "in_progress" if call_status == "in-progress" else "dialing"
+        campaign_call.last_outcome = call_status
+    elif call_status == "completed":
+        campaign_call.status = "completed"
+        campaign_call.last_outcome = call_status
+    elif call_status in RETRYABLE_OUTCOMES:
+        schedule_retry(campaign_call, call_status)
+    else:
+        return False
+    db.flush()
+    finish_campaign_if_done(db, campaign_call.campaign_id)
+    db.commit()
+    return True
+
+
+def campaign_progress(db: Session, campaign: Campaign) -> dict:
+    counts = dict(
+        db.query(CampaignCall.status, func.count(CampaignCall.id))
+        .filter(CampaignCall.campaign_id == campaign.id)
+        .group_by(CampaignCall.status)
+        .all()
+    )
+    return {
+        "id": campaign.id,
+        "name": campaign.name,
+        "status": campaign.status,
+        "timezone": campaign.timezone,
+        "window_start_hour": campaign.window_start_hour,
+        "window_end_hour": campaign.window_end_hour,
+        "max_attempts": campaign.max_attempts,
+        "total": sum(counts.values()),
+        "counts": counts,
+        "created_at": campaign.created_at,
+        "completed_at": campaign.completed_at,
+    }
+
+
+class Dialer:
+    def __init__(self):
+        per_second = settings.dialer_calls_per_second
+        self.pacer = TokenBucket(per_second * 60, capacity=max(1.0, per_second))
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="campaign-dialer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            db = SessionLocal()
+            try:
+                if self.dial_next(db):
+                    continue
+            except Exception:
+                log.exception("dialer error")
+                db.rollback()
+            finally:
+                db.close()
+
+            self._wakeup.wait(settings.dialer_poll_interval_seconds)
+            self._wakeup.clear()
+
+    def _next_due(self, db: Session):
+        now = datetime.utcnow()
+        candidates = (
+            db.query(CampaignCall)
+            .join(Campaign, Campaign.id == CampaignCall.campaign_id)
+            .options(joinedload(CampaignCall.campaign), joinedload(CampaignCall.client), joinedload(CampaignCall.agent))
+            .filter(Campaign.status == "active", CampaignCall.status == "queued", CampaignCall.next_attempt_at <= now)
+            .order_by(CampaignCall.next_attempt_at, CampaignCall.id)
+            .limit(50)
+            .all()
+        )
+        for campaign_call in candidates:
+            opening = next_window_opening(campaign_call, now)
+            if opening is None:
+                return campaign_call
+            # Outside the client's window: park it until the window opens instead of rescanning it
+            campaign_call.next_attempt_at = opening
+        db.commit()
+        return None
+
+    def dial_next(self, db: Session) -> bool:
+        """Place at most one call. Returns True if a call was attempted."""
+        expire_stale_calls(db)
+        if live_call_count(db) >= settings.dialer_max_live_calls:
+            return False
+        wait = self.pacer.wait_time(1)
+        if wait > 0:
+            time.sleep(wait)
+        campaign_call = self._next_due(db)
+        if campaign_call is None:
+            return False
+
+        # Conditional update so a second dialer process can't place the same call
+        claimed = db.query(CampaignCall).filter(
+            CampaignCall.id == campaign_call.id, CampaignCall.status == "queued"
+        ).update({CampaignCall.status: "dialing", CampaignCall.attempts: CampaignCall.attempts + 1}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return True
+        db.refresh(campaign_call)
+        self.pacer.consume(1)
+
+        client, agent = campaign_call.client, campaign_call.agent
+        try:
+            call = get_twilio_client().calls.create(
+                to=client.phone,
+                from_=settings.twilio_phone_number,
+                twiml=generate_twiml(client.name, agent.brokerage, agent.name),
+                status_callback=f"{settings.webhook_base_url}/call-status",
+                status_callback_event=["ringing", "answered", "completed"],
+                status_callback_method="POST",
+            )
+        except Exception as e:
+            log.warning("campaign call failed", extra={"fields": {
+                "campaign_id": campaign_call.campaign_id, "campaign_call_id": campaign_call.id, "error": str(e),
+            }})
+            schedule_retry(campaign_call, "error", str(e))
+            db.flush()
+            finish_campaign_if_done(db, campaign_call.campaign_id)
+            db.commit()
+            return True
+
+        campaign_call.call_sid = call.sid
+        campaign_call.last_error = None
+        # The Call row is what the recording webhook matches feedback against
+        db.add(Call(client_id=client.id, agent_id=agent.id, twilio_sid=call.sid))
+        db.commit()
+        log.info("dialed campaign call", extra={"fields": {
+            "campaign_id": campaign_call.campaign_id, "campaign_call_id": campaign_call.id,
+            "attempt": campaign_call.attempts, "call_sid": call.sid,
+        }})
+        return True
+
+
+dialer = Dialer()
@@ -0,0 +1,109 @@
+"""Change notifications for the dashboard over Server-Sent Events.
+
+Code that commits a change calls publish() (from a request handler or a
+background worker thread). Each /events subscriber gets the event on its
+own bounded queue. A small history is kept so a reconnecting EventSource
+can resume from its Last-Event-ID. A subscriber that falls too far behind,
+or resumes from before the history, gets a "resync" event and refetches
+instead.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from models import Feedback
+from feedback_views import enrich_feedback
+from rollups import agent_rating, sentiment_counts
+from config import settings
+
+
+class Event(NamedTuple):
+    id: int
+    type: str
+    data: str  # JSON
+
+
+RESYNC = Event(0, "resync", "{}")
+
+
+def format_sse(event: Event) -> str:
+    lines = [f"event: {event.type}", f"data: {event.data}"]
+    if event.id:
+        lines.insert(0, f"id: {event.id}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBroker:
+    def __init__(self, history_size: int = None, queue_size: int = None):
+        self.queue_size = queue_size or settings.events_queue_size
+        self._history = deque(maxlen=history_size or settings.events_history_size)
+        self._subscribers = {}  # queue -> event loop it belongs to
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def publish(self, event_type: str, data) -> Event:
+        payload = json.dumps(jsonable_encoder(data))
+        with self._lock:
+            event = Event(self._next_id, event_type, payload)
+            self._next_id += 1
+            self._history.append(event)
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's event loop has shut down
+                self.unsubscribe(queue)
+        return event
+
+    def _deliver(self, queue: asyncio.Queue, event: Event):
+        if queue.full():
+            # Too slow to keep up: drop its backlog and have it refetch
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+            return
+        queue.put_nowait(event)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> asyncio.Queue:
+        """Register a subscriber on the running event loop, queueing any events it missed."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                missed = [event for event in self._history if event.id > last_event_id]
+                oldest = self._history[0].id if self._history else self._next_id
+                if last_event_id < oldest - 1 or len(missed) >= self.queue_size:
+                    queue.put_nowait(RESYNC)
+                else:
+                    for event in missed:
+                        queue.put_nowait(event)
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "last_event_id": self._next_id - 1}
+
+
+event_broker = EventBroker()
+
+
+def publish_feedback_created(db: Session, feedback: Feedback):
+    """Push a committed feedback row and the aggregates it changed."""
+    event_broker.publish("feedback.created", enrich_feedback(feedback))
+    event_broker.publish("stats.updated", {
+        "agent": agent_rating(db, feedback.agent_id) if feedback.agent_id is not None else None,
+        "sentiment": sentiment_counts(db),
+    })
+
+
+def publish_call_status(call_sid: str, status: str):
+    event_broker.publish("call.status", {"call_sid": call_sid, "status": status})
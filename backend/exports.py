@@ -0,0 +1,131 @@
+"""Streaming bulk export of feedback and calls as NDJSON or CSV.
+
+Rows come from a single SELECT with client and agent names joined in,
+read through a server-side cursor (stream_results) in batches of
+EXPORT_BATCH_SIZE, and serialized one batch at a time. Memory stays flat
+however many rows match, and the first bytes go out as soon as the first
+batch is read. The generators open their own connection because the
+request's session is closed before a streaming response finishes.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List
+
+from sqlalchemy import select
+from database import engine
+from models import Agent, Call, Client, Feedback
+from feedback_views import parse_action_items
+
+EXPORT_BATCH_SIZE = 1000
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+FEEDBACK_FIELDS = [
+    "id", "created_at", "agent_id", "agent_name", "brokerage", "client_id", "client_name", "client_phone",
+    "call_id", "twilio_sid", "sentiment", "rating", "summary", "action_items",
+]
+CALL_FIELDS = [
+    "id", "created_at", "twilio_sid", "agent_id", "agent_name", "brokerage", "client_id", "client_name",
+    "client_phone", "recording_url",
+]
+
+
+def _filter_and_order(statement, model, agent_id: int, created_after: datetime, created_before: datetime):
+    if agent_id is not None:
+        statement = statement.where(model.agent_id == agent_id)
+    if created_after is not None:
+        statement = statement.where(model.created_at >= created_after)
+    if created_before is not None:
+        statement = statement.where(model.created_at < created_before)
+    # Oldest first, so an interrupted export can be resumed with created_after
+    return statement.order_by(model.created_at, model.id)
+
+
+def feedback_export_query(agent_id: int = None, sentiment: str = None, created_after: datetime = None,
+                          created_before: datetime = None, include_transcripts: bool = False):
+    columns = [
+        Feedback.id, Feedback.created_at, Feedback.agent_id, Agent.name.label("agent_name"), Agent.brokerage,
+        Feedback.client_id, Client.name.label("client_name"), Client.phone.label("client_phone"),
+        Feedback.call_id, Call.twilio_sid, Feedback.sentiment, Feedback.rating, Feedback.summary, Feedback.action_items,
+    ]
+    if include_transcripts:
+        columns.append(Call.transcript)
+    statement = (
+        select(*columns)
+        .outerjoin(Agent, Agent.id == Feedback.agent_id)
+        .outerjoin(Client, Client.id == Feedback.client_id)
+        .outerjoin(Call, Call.id == Feedback.call_id)
+    )
+    if sentiment:
+        statement = statement.where(Feedback.sentiment == sentiment)
+    return _filter_and_order(statement, Feedback, agent_id, created_after, created_before)
+
+
+def call_export_query(agent_id: int = None, created_after: datetime = None, created_before: datetime = None,
+                      include_transcripts: bool = False):
+    columns = [
+        Call.id, Call.created_at, Call.twilio_sid, Call.agent_id, Agent.name.label("agent_name"), Agent.brokerage,
+        Call.client_id, Client.name.label("client_name"), Client.phone.label("client_phone"), Call.recording_url,
+    ]
+    if include_transcripts:
+        columns.append(Call.transcript)
+    statement = (
+        select(*columns)
+        .outerjoin(Agent, Agent.id == Call.agent_id)
+        .outerjoin(Client, Client.id == Call.client_id)
+    )
+    return _filter_and_order(statement, Call, agent_id, created_after, created_before)
+
+
+def _stream_rows(statement) -> Iterator[List[dict]]:
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(statement)
+        for batch in result.mappings().partitions():
+            yield [dict(row) for row in batch]
+
+
+def _ndjson(batches: Iterator[List[dict]]) -> Iterator[str]:
+    for batch in batches:
+        lines = []
+        for row in batch:
+            if "action_items" in row:
+                row["action_items"] = parse_action_items(row["action_items"])
+            lines.append(json.dumps(row, default=_json_default) + "\n")
+        yield "".join(lines)
+
+
+def _csv(batches: Iterator[List[dict]], fields: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    # The header goes out before the query runs so clients see the response start right away
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            if "action_items" in row:
+                row["action_items"] = "; ".join(parse_action_items(row["action_items"]))
+            if row.get("created_at") is not None:
+                row["created_at"] = row["created_at"].isoformat()
+            writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def export_stream(kind: str, fmt: str, include_transcripts: bool = False, **filters) -> Iterator[str]:
+    """Serialized export of "feedback" or "calls" in "ndjson" or "csv", as a lazy stream of text chunks."""
+    if kind == "feedback":
+        statement, fields = feedback_export_query(include_transcripts=include_transcripts, **filters), FEEDBACK_FIELDS
+    else:
+        statement, fields = call_export_query(include_transcripts=include_transcripts, **filters), CALL_FIELDS
+    if include_transcripts:
+        fields = fields + ["transcript"]
+    batches = _stream_rows(statement)
+    return _csv(batches, fields) if fmt == "csv" else _ndjson(batches)
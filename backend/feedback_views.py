@@ -0,0 +1,54 @@
+import json
+from datetime import datetime
+from typing import List
+
+from sqlalchemy.orm import Session, joinedload
+from models import Feedback
+
+
+def parse_action_items(value) -> List[str]:
+    if not value:
+        return []
+    try:
+        items = json.loads(value)
+    except (TypeError, ValueError):
+        return [value]
+    if not isinstance(items, list):
+        return [str(items)]
+    return [str(item) for item in items]
+
+
+def enriched_feedback_query(
+    db: Session,
+    agent_id: int = None,
+    sentiment: str = None,
+    created_after: datetime = None,
+    created_before: datetime = None,
+):
+    # Client and agent are joined into the same SELECT instead of lazy-loading one row at a time
+    query = db.query(Feedback).options(joinedload(Feedback.client), joinedload(Feedback.agent))
+    if agent_id is not None:
+        query = query.filter(Feedback.agent_id == agent_id)
+    if sentiment:
+        query = query.filter(Feedback.sentiment == sentiment)
+    if created_after is not None:
+        query = query.filter(Feedback.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(Feedback.created_at < created_before)
+    return query.order_by(Feedback.created_at.desc(), Feedback.id.desc())
+
+
+def enrich_feedback(feedback: Feedback) -> dict:
+    return {
+        "id": feedback.id,
+        "client_id": feedback.client_id,
+        "agent_id": feedback.agent_id,
+        "call_id": feedback.call_id,
+        "client_name": feedback.client.name if feedback.client else "Unknown",
+        "agent_name": feedback.agent.name if feedback.agent else "Unknown",
+        "sentiment": feedback.sentiment,
+        "rating": feedback.rating,
+        "summary": feedback.summary,
+        "action_items": parse_action_items(feedback.action_items),
+        "created_at": feedback.created_at,
+    }
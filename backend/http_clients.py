@@ -0,0 +1,140 @@
+"""Process-wide HTTP clients for Twilio and OpenAI.
+
+Every outbound request goes through one of the clients below so TCP/TLS
+connections are kept alive and reused instead of being re-established per
+recording. Each client is created on first use and shared by all threads.
+httpx, requests and the SDKs are imported there too, which keeps them out
+of the app's import time.
+"""
+import importlib.util
+import threading
+
+from config import settings
+
+_lock = threading.Lock()
+_http_session = None
+_twilio_client = None
+_openai_client = None
+_async_http_client = None
+
+
+def http2_available() -> bool:
+    if not settings.http2_enabled:
+        return False
+    # httpx only negotiates HTTP/2 when h2 is installed
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_http_session():
+    """Keep-alive requests.Session shared by the Twilio REST client and recording downloads."""
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.http_pool_connections,
+                pool_maxsize=settings.http_pool_size,
+                pool_block=True,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def get_twilio_client():
+    global _twilio_client
+    session = get_http_session()
+    with _lock:
+        if _twilio_client is None:
+            settings.require("twilio_account_sid", "twilio_auth_token")
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client as TwilioClient
+
+            http_client = TwilioHttpClient(pool_connections=True, timeout=settings.http_timeout_seconds)
+            http_client.session.close()
+            http_client.session = session
+            _twilio_client = TwilioClient(settings.twilio_account_sid, settings.twilio_auth_token, http_client=http_client)
+            _twilio_client.api.base_url = settings.twilio_api_base_url
+        return _twilio_client
+
+
+def get_openai_client():
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            settings.require("openai_api_key")
+            import httpx
+            from openai import OpenAI
+
+            http_client = httpx.Client(
+                http2=http2_available(),
+                limits=httpx.Limits(
+                    max_connections=settings.http_pool_size,
+                    max_keepalive_connections=settings.http_pool_size,
+                    keepalive_expiry=settings.http_keepalive_seconds,
+                ),
+                timeout=httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds),
+            )
+            # Retries are owned by llm_scheduler, which also sees the rate-limit budget
+            _openai_client = OpenAI(
+                api_key=settings.openai_api_key, base_url=settings.openai_base_url, http_client=http_client, max_retries=0
+            )
+        return _openai_client
+
+
+def get_async_http_client():
+    """Pooled httpx.AsyncClient for Twilio REST calls made from async request handlers."""
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            settings.require("twilio_account_sid", "twilio_auth_token")
+            import httpx
+
+            _async_http_client = httpx.AsyncClient(
+                http2=http2_available(),
+                auth=(settings.twilio_account_sid, settings.twilio_auth_token),
+                limits=httpx.Limits(
+                    max_connections=settings.http_pool_size,
+                    max_keepalive_connections=settings.http_pool_size,
+                    keepalive_expiry=settings.http_keepalive_seconds,
+                ),
+                timeout=httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds),
+            )
+        return _async_http_client
+
+
+async def create_twilio_call(to: str, from_: str, twiml: str, **params) -> str:
+    """Place a call through Twilio's REST API without blocking the event loop; returns the Call SID."""
+    data = {"To": to, "From": from_, "Twiml": twiml}
+    for name, value in params.items():
+        # Same snake_case -> PascalCase mapping the Twilio SDK uses (status_callback -> StatusCallback)
+        data["".join(part.capitalize() for part in name.split("_"))] = value
+    response = await get_async_http_client().post(
+        f"{settings.twilio_api_base_url}/2010-04-01/Accounts/{settings.twilio_account_sid}/Calls.json",
+        data=data,
+    )
+    if response.is_error:
+        raise RuntimeError(f"Twilio call creation failed ({response.status_code}): {response.text}")
+    return response.json()["sid"]
+
+
+async def close_async_http_clients():
+    global _async_http_client
+    with _lock:
+        client, _async_http_client = _async_http_client, None
+    if client is not None:
+        await client.aclose()
+
+
+def close_http_clients():
+    global _http_session, _twilio_client, _openai_client
+    with _lock:
+        if _openai_client is not None:
+            _openai_client.close()
+        if _http_session is not None:
+            _http_session.close()
+        _http_session = _twilio_client = _openai_client = None
@@ -0,0 +1,494 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import ProcessingJob, CallSegment, Call, Agent, Feedback
+from ai_service import analyze_feedback, fetch_recording, transcribe_recording, audio_slots, RecordingTooLarge, cached_transcription, cache_transcription
+from rollups import record_feedback
+from events import publish_feedback_created
+from metrics import feedback_lag_seconds, jobs_finished, stage_timer, transcriptions
+from tracing import current_trace_id, get_logger, trace
+from segments import RECORDINGS_PER_CALL, combine_segments, order_segments
+from config import settings
+
+log = get_logger("jobs")
+
+
+class PermanentJobError(Exception):
+    """Raised by a stage when retrying the job cannot succeed."""
+
+
+class LeaseLost(Exception):
+    """The job was re-queued or claimed by another worker while this one was running it."""
+
+
+def recording_dedupe_key(recording_sid: str) -> str:
+    return f"recording:{recording_sid}"
+
+
+def enqueue_recording_job(db: Session, call_sid: str, recording_sid: str, recording_url: str, recording_started_at: datetime = None) -> ProcessingJob:
+    job = ProcessingJob(
+        kind="recording",
+        dedupe_key=recording_dedupe_key(recording_sid),
+        call_sid=call_sid,
+        recording_sid=recording_sid,
+        recording_url=recording_url,
+        recording_started_at=recording_started_at,
+        trace_id=current_trace_id(),
+        status="queued",
+        stage="download",
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(job)
+    return job
+
+
+async def _attach_duplicate(db: AsyncSession, recording_sid: str):
+    dedupe_key = recording_dedupe_key(recording_sid)
+    await db.execute(
+        update(ProcessingJob)
+        .where(ProcessingJob.dedupe_key == dedupe_key)
+        .values(duplicate_deliveries=ProcessingJob.duplicate_deliveries + 1)
+    )
+    await db.commit()
+    return (await db.execute(select(ProcessingJob).where(ProcessingJob.dedupe_key == dedupe_key))).scalar_one_or_none()
+
+
+async def accept_recording_delivery(db: AsyncSession, call_sid: str, recording_sid: str, recording_url: str, recording_started_at: datetime = None):
+    """Record a recording callback at most once per RecordingSid.
+
+    Returns (job, created). A Twilio retry of a callback we already accepted
+    attaches to the existing job, whatever its state, instead of queueing
+    another download, transcription and analysis.
+    """
+    existing = (await db.execute(
+        select(ProcessingJob.id).where(ProcessingJob.dedupe_key == recording_dedupe_key(recording_sid))
+    )).scalar_one_or_none()
+    if existing is not None:
+        return await _attach_duplicate(db, recording_sid), False
+
+    job = enqueue_recording_job(db, call_sid, recording_sid, recording_url, recording_started_at)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent delivery of the same recording inserted first
+        await db.rollback()
+        return await _attach_duplicate(db, recording_sid), False
+    return job, True
+
+
+def enqueue_call_job(db: Session, call_sid: str):
+    # dedupe_key is unique, so each call is analyzed at most once however many workers race here
+    job = ProcessingJob(
+        kind="call",
+        dedupe_key=f"call:{call_sid}",
+        call_sid=call_sid,
+        trace_id=current_trace_id(),
+        status="queued",
+        stage="analyze",
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    log.info("queued call analysis job", extra={"fields": {"job_id": job.id, "call_sid": call_sid}})
+    return job
+
+
+def enqueue_timed_out_calls(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.segment_timeout_seconds)
+    in_flight = db.query(ProcessingJob.call_sid).filter(
+        ProcessingJob.kind == "recording",
+        ProcessingJob.status.in_(["queued", "running"]),
+    )
+    analyzed = db.query(ProcessingJob.call_sid).filter(ProcessingJob.kind == "call")
+    stale = (
+        db.query(CallSegment.call_sid)
+        .filter(CallSegment.call_sid.notin_(in_flight), CallSegment.call_sid.notin_(analyzed))
+        .group_by(CallSegment.call_sid)
+        .having(func.max(CallSegment.created_at) < cutoff)
+        .all()
+    )
+    count = 0
+    for (call_sid,) in stale:
+        log.info("segment timeout, analyzing the answers received so far", extra={"fields": {"call_sid": call_sid}})
+        if enqueue_call_job(db, call_sid) is not None:
+            count += 1
+    return count
+
+
+def recover_interrupted_jobs(db: Session) -> int:
+    # Jobs still "running" past their lease were interrupted mid-stage by a process that died; run them again.
+    # Running jobs renew their lease from a heartbeat (JobLease), so jobs of live peer processes keep it.
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.job_lease_seconds)
+    count = db.query(ProcessingJob).filter(
+        ProcessingJob.status == "running",
+        (ProcessingJob.updated_at < cutoff) | ProcessingJob.updated_at.is_(None),
+    ).update(
+        {ProcessingJob.status: "queued", ProcessingJob.next_attempt_at: datetime.utcnow(), ProcessingJob.lease_token: None},
+        synchronize_session=False,
+    )
+    db.commit()
+    return count
+
+
+def claim_next_job(db: Session):
+    now = datetime.utcnow()
+    candidates = (
+        db.query(ProcessingJob.id)
+        .filter(ProcessingJob.status == "queued", ProcessingJob.next_attempt_at <= now)
+        .order_by(ProcessingJob.next_attempt_at, ProcessingJob.id)
+        .limit(settings.job_worker_concurrency)
+        .all()
+    )
+    for (job_id,) in candidates:
+        # Conditional update so two workers can never claim the same job
+        claimed = db.query(ProcessingJob).filter(
+            ProcessingJob.id == job_id, ProcessingJob.status == "queued"
+        ).update(
+            {ProcessingJob.status: "running", ProcessingJob.updated_at: now, ProcessingJob.lease_token: uuid.uuid4().hex},
+            synchronize_session=False,
+        )
+        db.commit()
+        if claimed:
+            return db.get(ProcessingJob, job_id)
+    return None
+
+
+class JobLease:
+    """Keeps a claimed job's lease fresh from a heartbeat thread while its stages run.
+
+    A stage can sit in the LLM scheduler's queue or backoff for longer than
+    job_lease_seconds, so stage changes alone can't keep the lease alive.
+    """
+
+    def __init__(self, job_id: int, token: str):
+        self.job_id = job_id
+        self.token = token
+        self.lost = False
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f"job-lease-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopping.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopping.wait(settings.job_lease_seconds / 3):
+            if not self.renew():
+                return
+
+    def renew(self) -> bool:
+        db = SessionLocal()
+        try:
+            renewed = db.query(ProcessingJob).filter(
+                ProcessingJob.id == self.job_id, ProcessingJob.lease_token == self.token, ProcessingJob.status == "running"
+            ).update({ProcessingJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        except Exception:
+            # A failed heartbeat isn't a lost lease; the next one may get through
+            log.exception("job lease renewal failed", extra={"fields": {"job_id": self.job_id}})
+            return True
+        finally:
+            db.close()
+        if not renewed:
+            self.lost = True
+        return bool(renewed)
+
+
+_current_lease = contextvars.ContextVar("job_lease", default=None)
+
+
+def _check_lease(db: Session, job: ProcessingJob):
+    """Raise LeaseLost unless this worker still holds the job; call before committing its results."""
+    lease = _current_lease.get()
+    if lease is None:
+        return
+    token = db.query(ProcessingJob.lease_token).filter(ProcessingJob.id == job.id).scalar()
+    if lease.lost or token != lease.token:
+        raise LeaseLost(f"job {job.id} is no longer leased to this worker")
+
+
+def _set_stage(db: Session, job: ProcessingJob, stage: str):
+    _check_lease(db, job)
+    job.stage = stage
+    job.updated_at = datetime.utcnow()
+    db.commit()
+
+
+def run_job(db: Session, job: ProcessingJob):
+    # Continue the trace of the webhook that queued this work
+    with trace(job.trace_id or f"job-{job.id}"), JobLease(job.id, job.lease_token) as lease:
+        lease_context = _current_lease.set(lease)
+        try:
+            with stage_timer(f"{job.kind}_job", job_id=job.id):
+                if job.kind == "call":
+                    run_call_job(db, job)
+                else:
+                    run_recording_job(db, job)
+            jobs_finished.inc(kind=job.kind, outcome="succeeded")
+        except LeaseLost as e:
+            # Another worker owns the job now; leave its state to that worker
+            db.rollback()
+            log.warning("job lease lost, discarding this run", extra={"fields": {"job_id": job.id, "error": str(e)}})
+        except Exception as e:
+            db.rollback()
+            _record_failure(db, job, e)
+        finally:
+            _current_lease.reset(lease_context)
+
+
+def run_recording_job(db: Session, job: ProcessingJob):
+    if job.transcript is None:
+        job.transcript = cached_transcription(job.recording_sid)
+        if job.transcript is not None:
+            transcriptions.inc(result="cached")
+            log.info("reused cached transcript", extra={"fields": {"job_id": job.id, "recording_sid": job.recording_sid}})
+
+    if job.transcript is None:
+        try:
+            with audio_slots:
+                _set_stage(db, job, "download")
+                try:
+                    audio = fetch_recording(job.recording_url)
+                except RecordingTooLarge as e:
+                    raise PermanentJobError(str(e))
+                with audio:
+                    _set_stage(db, job, "transcribe")
+                    job.transcript = transcribe_segment(job, audio)
+        except Exception:
+            # Failed downloads count too; each failed attempt is one error
+            transcriptions.inc(result="error")
+            raise
+        cache_transcription(job.recording_sid, job.transcript)
+        _check_lease(db, job)
+        db.commit()
+        # Transcripts are client call content: only their length at INFO, the text at DEBUG
+        log.info("transcribed recording", extra={"fields": {"job_id": job.id, "recording_sid": job.recording_sid, "transcript_chars": len(job.transcript)}})
+        log.debug("transcript", extra={"fields": {"job_id": job.id, "transcript": job.transcript}})
+
+    _set_stage(db, job, "collect")
+    collect_segment(db, job)
+
+    segment_count = db.query(CallSegment).filter(CallSegment.call_sid == job.call_sid).count()
+    log.info("collected segment", extra={"fields": {"call_sid": job.call_sid, "segments": segment_count, "expected": RECORDINGS_PER_CALL}})
+    if segment_count >= RECORDINGS_PER_CALL:
+        if enqueue_call_job(db, job.call_sid) is None and segment_count > RECORDINGS_PER_CALL:
+            log.info("recording arrived after its call was analyzed", extra={"fields": {"call_sid": job.call_sid, "recording_sid": job.recording_sid}})
+
+
+def transcribe_segment(job: ProcessingJob, audio) -> str:
+    if not settings.audio_preprocessing_enabled:
+        text = transcribe_recording(audio)
+        transcriptions.inc(result="ok")
+        return text
+
+    from audio import preprocess_recording
+    with stage_timer("audio_preprocess", job_id=job.id):
+        processed = preprocess_recording(audio)
+    job.audio_bytes_saved = processed.bytes_saved
+    job.audio_seconds_saved = round(processed.seconds_saved, 2)
+    log.info("preprocessed audio", extra={"fields": {
+        "job_id": job.id,
+        "original_bytes": processed.original_bytes,
+        "processed_bytes": processed.processed_bytes,
+        "original_seconds": round(processed.original_seconds, 1),
+        "processed_seconds": round(processed.processed_seconds, 1),
+    }})
+    if processed.is_silent:
+        # A silent answer is still a segment, it just doesn't cost a Whisper call
+        transcriptions.inc(result="silent")
+        return ""
+    with processed.audio:
+        text = transcribe_recording(processed.audio)
+    transcriptions.inc(result="ok")
+    return text
+
+
+def collect_segment(db: Session, job: ProcessingJob):
+    segment = db.query(CallSegment).filter(CallSegment.recording_sid == job.recording_sid).first()
+    if segment is None:
+        segment = CallSegment(call_sid=job.call_sid, recording_sid=job.recording_sid)
+        db.add(segment)
+    segment.recording_url = job.recording_url
+    segment.transcript = job.transcript
+    segment.started_at = job.recording_started_at
+
+    # The segment and the job completion commit together
+    job.status = "succeeded"
+    job.stage = "done"
+    job.last_error = None
+    _check_lease(db, job)
+    with stage_timer("segment_commit", job_id=job.id):
+        db.commit()
+
+
+def run_call_job(db: Session, job: ProcessingJob):
+    call = db.query(Call).filter(Call.twilio_sid == job.call_sid).first()
+    if not call:
+        raise PermanentJobError(f"Call not found for sid: {job.call_sid}")
+
+    if job.analysis is None:
+        _set_stage(db, job, "analyze")
+        segments = order_segments(db.query(CallSegment).filter(CallSegment.call_sid == job.call_sid).all())
+        agent = db.get(Agent, call.agent_id)
+        job.transcript = combine_segments(segments, agent.name if agent else "the agent")
+        job.recording_url = segments[-1].recording_url if segments else None
+        # Raise on unparseable output so the job retries instead of saving the neutral 5/10 fallback
+        analysis = analyze_feedback(job.transcript, raise_on_failure=True)
+        job.analysis = json.dumps(analysis)
+        _check_lease(db, job)
+        db.commit()
+        log.info("analyzed call", extra={"fields": {
+            "job_id": job.id, "call_sid": job.call_sid,
+            "sentiment": analysis["overall_sentiment"], "rating": analysis["rating_estimate"],
+        }})
+        log.debug("analysis", extra={"fields": {"job_id": job.id, "analysis": analysis}})
+
+    _set_stage(db, job, "persist")
+    persist_feedback(db, job, call)
+    log.info("call processed", extra={"fields": {"job_id": job.id, "call_sid": job.call_sid, "feedback_id": job.feedback_id}})
+
+
+def persist_feedback(db: Session, job: ProcessingJob, call: Call):
+    # Update call with the combined transcript
+    call.transcript = job.transcript
+    call.recording_url = job.recording_url
+
+    analysis = json.loads(job.analysis)
+    feedback = Feedback(
+        client_id=call.client_id,
+        agent_id=call.agent_id,
+        call_id=call.id,
+        sentiment=analysis["overall_sentiment"],
+        rating=analysis["rating_estimate"],
+        summary=analysis["summary"],
+        action_items=json.dumps(analysis["action_items"])
+    )
+    db.add(feedback)
+    db.flush()
+    record_feedback(db, feedback)
+
+    # The feedback row, its rollups and the job completion commit together, so a crash can't persist it twice.
+    # A worker that re-ran the job after its lease expired loses this conditional update and discards its copy.
+    claimed = db.query(ProcessingJob).filter(
+        ProcessingJob.id == job.id, ProcessingJob.feedback_id.is_(None)
+    ).update({ProcessingJob.feedback_id: feedback.id}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        log.warning("feedback already persisted for this job, discarding duplicate", extra={"fields": {"job_id": job.id}})
+        return
+    job.feedback_id = feedback.id
+    job.status = "succeeded"
+    job.stage = "done"
+    job.last_error = None
+    _check_lease(db, job)
+    with stage_timer("db_commit", job_id=job.id):
+        db.commit()
+    if job.created_at is not None:
+        feedback_lag_seconds.observe((datetime.utcnow() - job.created_at).total_seconds())
+    publish_feedback_created(db, feedback)
+
+
+def _record_failure(db: Session, job: ProcessingJob, error: Exception):
+    db.refresh(job)
+    job.attempts += 1
+    job.last_error = f"{job.stage}: {error}"
+    fields = {"job_id": job.id, "stage": job.stage, "attempt": job.attempts, "error": str(error)}
+    if isinstance(error, PermanentJobError) or job.attempts >= settings.job_max_attempts:
+        job.status = "failed"
+        jobs_finished.inc(kind=job.kind, outcome="failed")
+        log.error("job failed permanently", extra={"fields": fields})
+    else:
+        delay = settings.job_retry_base_seconds * (2 ** (job.attempts - 1))
+        job.status = "queued"
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        jobs_finished.inc(kind=job.kind, outcome="retry")
+        log.warning("job failed, retrying", extra={"fields": {**fields, "retry_in_seconds": delay}})
+    db.commit()
+
+
+class JobWorkerPool:
+    """Runs queued ProcessingJobs on a fixed number of background threads."""
+
+    def __init__(self, concurrency: int = None, poll_interval: float = None):
+        self.concurrency = concurrency or settings.job_worker_concurrency
+        self.poll_interval = poll_interval or settings.job_poll_interval_seconds
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._next_recovery = 0.0
+
+    def _recovery_due(self) -> bool:
+        # A lease is minutes long, so checking a few times per lease is plenty
+        now = time.monotonic()
+        if now < self._next_recovery:
+            return False
+        self._next_recovery = now + settings.job_lease_seconds / 10
+        return True
+
+    def start(self):
+        db = SessionLocal()
+        try:
+            recovered = recover_interrupted_jobs(db)
+            if recovered:
+                log.info("re-queued interrupted jobs", extra={"fields": {"count": recovered}})
+        finally:
+            db.close()
+
+        self._stopping.clear()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            db = SessionLocal()
+            try:
+                job = claim_next_job(db)
+                if job is not None:
+                    run_job(db, job)
+                    continue
+                # Idle: finalize calls whose remaining recordings never arrived
+                if enqueue_timed_out_calls(db):
+                    continue
+                # and re-queue jobs whose process died mid-run, once their lease has run out
+                if self._recovery_due() and recover_interrupted_jobs(db):
+                    continue
+            except Exception:
+                log.exception("job worker error")
+            finally:
+                db.close()
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+worker_pool = JobWorkerPool()
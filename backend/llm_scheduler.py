@@ -0,0 +1,230 @@
+"""Admission control for OpenAI calls.
+
+Every chat completion and transcription goes through an LLMScheduler, which:
+- keeps requests and tokens per minute under budget with token buckets,
+- admits waiting callers strictly by priority (live webhook work before backfill),
+- retries 429/5xx/connection errors with jittered exponential backoff,
+- opens a circuit breaker after sustained failures so we stop hammering the API.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from tracing import get_logger
+from config import settings
+
+log = get_logger("llm")
+
+LIVE = 0
+BACKFILL = 1
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling OpenAI while the circuit breaker is open."""
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        # Correct an estimate once real usage is known; may leave the bucket in debt
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def api_error():
+    """openai.APIError, imported on first use; the SDK is slow to import and only needed once we call it."""
+    import openai
+    return openai.APIError
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float = None, max_concurrency: int = 8):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
+
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def run(self, call, priority: int = LIVE, estimated_tokens: int = 0):
+        """Run `call()` once admitted, retrying transient OpenAI errors."""
+        for attempt in range(settings.llm_max_retries + 1):
+            self._check_circuit()
+            self._acquire(priority, estimated_tokens)
+            try:
+                result = call()
+            except Exception as e:
+                self._release()
+                if not is_retryable(e):
+                    with self._cond:
+                        self.failed += 1
+                    raise
+                self._record_failure()
+                if attempt == settings.llm_max_retries:
+                    raise
+                delay = self._backoff(attempt, _retry_after(e))
+                log.warning("llm call failed, retrying", extra={"fields": {
+                    "scheduler": self.name, "error": type(e).__name__, "retry": attempt + 1, "retry_in_seconds": round(delay, 2),
+                }})
+                with self._cond:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
+
+            self._release()
+            self._record_success(result, estimated_tokens)
+            return result
+
+    def _backoff(self, attempt: int, retry_after: float = None) -> float:
+        # Full jitter keeps many workers that hit the same 429 from retrying in lockstep
+        delay = random.uniform(0, min(settings.llm_backoff_max_seconds, settings.llm_backoff_base_seconds * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def _check_circuit(self):
+        with self._cond:
+            if self._circuit_open_until > time.monotonic():
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit open after {self._consecutive_failures} consecutive failures")
+
+    def _acquire(self, priority: int, tokens: int):
+        entry = (priority, next(self._sequence))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == entry and self._in_flight < self.max_concurrency:
+                        wait = self.request_bucket.wait_time(1)
+                        if self.token_bucket is not None:
+                            wait = max(wait, self.token_bucket.wait_time(tokens))
+                        if wait == 0:
+                            break
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._remove(entry)
+
+            self.request_bucket.consume(1)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(tokens)
+            self._in_flight += 1
+            waited = time.monotonic() - started
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            # The next waiter in line may be admissible right away
+            self._cond.notify_all()
+
+    def _remove(self, entry):
+        if self._waiters and self._waiters[0] == entry:
+            heapq.heappop(self._waiters)
+        else:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _record_success(self, result, estimated_tokens: int):
+        usage = getattr(result, "usage", None)
+        actual_tokens = getattr(usage, "total_tokens", None)
+        with self._cond:
+            self.completed += 1
+            self._consecutive_failures = 0
+            self._circuit_open_until = 0.0
+            if self.token_bucket is not None and isinstance(actual_tokens, int):
+                self.token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    def _record_failure(self):
+        with self._cond:
+            self.failed += 1
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= settings.llm_circuit_failure_threshold:
+                self._circuit_open_until = time.monotonic() + settings.llm_circuit_reset_seconds
+                log.error("llm circuit open", extra={"fields": {
+                    "scheduler": self.name, "consecutive_failures": self._consecutive_failures,
+                    "reset_seconds": settings.llm_circuit_reset_seconds,
+                }})
+
+    def stats(self) -> dict:
+        with self._cond:
+            admitted = self.completed + self.failed
+            return {
+                "queue_depth": len(self._waiters),
+                "live_waiting": sum(1 for priority, _ in self._waiters if priority == LIVE),
+                "backfill_waiting": sum(1 for priority, _ in self._waiters if priority != LIVE),
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "average_wait_seconds": round(self.total_wait_seconds / admitted, 4) if admitted else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 4),
+                "circuit_open": self._circuit_open_until > time.monotonic(),
+                "consecutive_failures": self._consecutive_failures,
+            }
+
+
+chat_scheduler = LLMScheduler(
+    "openai-chat",
+    requests_per_minute=settings.openai_chat_rpm,
+    tokens_per_minute=settings.openai_chat_tpm,
+    max_concurrency=settings.llm_max_concurrency,
+)
+transcription_scheduler = LLMScheduler(
+    "openai-transcription",
+    requests_per_minute=settings.openai_transcription_rpm,
+    max_concurrency=settings.llm_max_concurrency,
+)
@@ -1,35 +1,130 @@
-from fastapi import FastAPI, Depends, HTTPException, Form, Request, Response
+import asyncio
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Form, Header, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+import anyio
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Base, Client, Agent, Feedback, Call
-from schemas import Client as ClientSchema, ClientCreate, Agent as AgentSchema, AgentCreate, Feedback as FeedbackSchema, FeedbackCreate, Call as CallSchema, CallCreate, AnalyzeRequest
-from typing import List
-from ai_service import analyze_feedback, transcribe_audio
-from twilio.rest import Client as TwilioClient
+from database import SessionLocal, AsyncSessionLocal, engine, async_engine
+from models import Client, Agent, Feedback, Call, ProcessingJob, Campaign, CampaignCall
+from schemas import Client as ClientSchema, ClientCreate, Agent as AgentSchema, AgentCreate, Feedback as FeedbackSchema, FeedbackCreate, Call as CallSchema, CallCreate, AnalyzeRequest, BatchAnalyzeRequest, BatchAnalyzeResponse, ProcessingJob as ProcessingJobSchema, AgentRating, SentimentCount, AgentTrendBucket, FeedbackPage, CampaignCreate, CampaignProgress, BulkUpsertResponse, SearchResponse, ActionItemCount
+from typing import List, Optional
+from datetime import datetime
+from ai_service import analyze_feedback, analyze_feedback_batch, analysis_cache, transcription_cache
+from jobs import accept_recording_delivery, worker_pool
+from segments import parse_recording_start_time
+from twiml import generate_twiml
+from dialer import dialer, campaign_progress, record_call_status, valid_timezone
+import rollups
+from llm_scheduler import CircuitOpenError, api_error, chat_scheduler, transcription_scheduler
+from sentiment import local_stats
+from events import event_broker, format_sse, publish_call_status, publish_feedback_created
+from feedback_views import enriched_feedback_query, enrich_feedback
+from exports import FORMATS as EXPORT_FORMATS, export_stream
+from response_cache import response_cache
+from action_items import top_action_items
+from search import InvalidSearchQuery, SearchUnavailable, search_feedback
+from bulk import BulkFormatError, read_batches, run_batch, summarize, upsert_agents, upsert_clients
+from pagination import after_cursor, encode_cursor, InvalidCursor
+from http_clients import create_twilio_call, close_http_clients, close_async_http_clients
 from twilio.twiml.voice_response import VoiceResponse
 from config import settings
-import json
+from migrations import migrate, pending_migrations
+from metrics import Gauge, http_request_seconds, registry, webhook_deliveries
+from tracing import configure_logging, get_logger, trace
 
-Base.metadata.create_all(bind=engine)
+log = get_logger("api")
 
-app = FastAPI(title="Realtor Feedback API", version="1.0.0")
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000", 
-        "http://127.0.0.1:3000",
-        "https://*.vercel.app",  # Allow Vercel preview deployments
-        "*"  # Allow all origins for demo (restrict in production)
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def trace_requests(request: Request, call_next):
+    # Reuse the caller's request ID when it looks sane so logs line up across services
+    incoming = request.headers.get("x-request-id", "")
+    with trace(incoming if _REQUEST_ID.match(incoming) else None) as trace_id:
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            route = request.scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=route.path if route is not None else "unmatched",
+                status=status,
+            )
+        response.headers["X-Request-ID"] = trace_id
+        return response
 
-twilio_client = TwilioClient(settings.twilio_account_sid, settings.twilio_auth_token)
+def prepare_database():
+    if settings.db_auto_migrate:
+        for migration_id in migrate(engine):
+            log.info("applied database migration", extra={"fields": {"migration": migration_id}})
+    else:
+        pending = pending_migrations(engine)
+        if pending:
+            raise RuntimeError(f"Database schema is behind ({', '.join(pending)}); run `python migrations.py`")
+
+    db = SessionLocal()
+    try:
+        if rollups.rollups_need_rebuild(db):
+            log.info("rebuilding stats rollups from existing feedback")
+            rollups.rebuild_rollups(db)
+    finally:
+        db.close()
+
+def purge_stale_cache():
+    purged = analysis_cache.purge_stale() + transcription_cache.purge_stale()
+    if purged:
+        log.info("purged stale cached results", extra={"fields": {"purged": purged}})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync endpoints run in AnyIO's shared threadpool; size it explicitly instead of relying on the default 40
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    await anyio.to_thread.run_sync(prepare_database)
+    worker_pool.start()
+    dialer.start()
+    # Housekeeping; nothing waits on it, so don't hold up the first request
+    threading.Thread(target=purge_stale_cache, name="cache-purge", daemon=True).start()
+    try:
+        yield
+    finally:
+        dialer.stop()
+        worker_pool.stop()
+        close_http_clients()
+        await close_async_http_clients()
+        await async_engine.dispose()
+
+def create_app() -> FastAPI:
+    configure_logging()
+    app = FastAPI(title="Realtor Feedback API", version="1.0.0", lifespan=lifespan)
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "http://localhost:3000", 
+            "http://127.0.0.1:3000",
+            "https://*.vercel.app",  # Allow Vercel preview deployments
+            "*"  # Allow all origins for demo (restrict in production)
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(trace_requests)
+    app.include_router(router)
+    return app
+
+router = APIRouter()
 
 def get_db():
     db = SessionLocal()
@@ -38,40 +133,41 @@ def get_db():
     finally:
         db.close()
 
-def generate_twiml(client_name, brokerage, agent_name):
-    response = VoiceResponse()
-    response.say("This call may be recorded and analyzed for quality purposes.")
-    response.say(f"Hi {client_name}, this is an automated follow-up from {brokerage}. How was your experience working with {agent_name}?")
-    response.record(timeout=5, playBeep=True, recordingStatusCallback=f'{settings.webhook_base_url}/webhook', recordingStatusCallbackMethod='POST')
-    response.say("Thank you for your feedback.")
-    response.say("What did you like most about the experience?")
-    response.record(timeout=5, playBeep=True, recordingStatusCallback=f'{settings.webhook_base_url}/webhook', recordingStatusCallbackMethod='POST')
-    response.say("Thank you for your feedback.")
-    response.say("Is there anything that could have been better?")
-    response.record(timeout=5, playBeep=True, recordingStatusCallback=f'{settings.webhook_base_url}/webhook', recordingStatusCallbackMethod='POST')
-    response.say("Thank you so much for your time and valuable feedback. We really appreciate you sharing your experience with us. Have a great day!")
-    response.hangup()
-    return str(response)
-
-@app.get("/")
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+@router.get("/")
 def read_root():
     return {"message": "Realtor Feedback API"}
 
 # Clients
-@app.post("/clients/", response_model=ClientSchema)
+@router.post("/clients/", response_model=ClientSchema)
 def create_client(client: ClientCreate, db: Session = Depends(get_db)):
     db_client = Client(**client.dict())
     db.add(db_client)
-    db.commit()
+    try:
+        # Flushes the insert, so a duplicate phone fails here too
+        rollups.bump_versions(db, "clients")
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"A client with phone {client.phone} already exists; use /clients/bulk to update it")
     db.refresh(db_client)
     return db_client
 
-@app.get("/clients/", response_model=List[ClientSchema])
-def read_clients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    clients = db.query(Client).offset(skip).limit(limit).all()
-    return clients
+@router.post("/clients/bulk", response_model=BulkUpsertResponse)
+async def bulk_upsert_clients(request: Request):
+    """Create or update clients by phone from a JSON array or NDJSON body."""
+    return await _bulk_upsert(request, upsert_clients)
+
+@router.get("/clients/", response_model=List[ClientSchema])
+def read_clients(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return response_cache.respond(
+        request, db, ["clients"], List[ClientSchema], lambda: db.query(Client).offset(skip).limit(limit).all()
+    )
 
-@app.get("/clients/{client_id}", response_model=ClientSchema)
+@router.get("/clients/{client_id}", response_model=ClientSchema)
 def read_client(client_id: int, db: Session = Depends(get_db)):
     client = db.query(Client).filter(Client.id == client_id).first()
     if client is None:
@@ -79,35 +175,152 @@ def read_client(client_id: int, db: Session = Depends(get_db)):
     return client
 
 # Agents
-@app.post("/agents/", response_model=AgentSchema)
+@router.post("/agents/", response_model=AgentSchema)
 def create_agent(agent: AgentCreate, db: Session = Depends(get_db)):
     db_agent = Agent(**agent.dict())
     db.add(db_agent)
+    rollups.bump_versions(db, "agents")
     db.commit()
     db.refresh(db_agent)
     return db_agent
 
-@app.get("/agents/", response_model=List[AgentSchema])
-def read_agents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    agents = db.query(Agent).offset(skip).limit(limit).all()
-    return agents
+@router.post("/agents/bulk", response_model=BulkUpsertResponse)
+async def bulk_upsert_agents(request: Request):
+    """Create agents that don't exist yet, matched by name and brokerage."""
+    return await _bulk_upsert(request, upsert_agents)
+
+async def _bulk_upsert(request: Request, upsert):
+    results = []
+    try:
+        async for batch in read_batches(request):
+            # Each batch is its own transaction, run in the threadpool like the sync endpoints
+            results.extend(await anyio.to_thread.run_sync(run_batch, upsert, batch))
+    except BulkFormatError as e:
+        raise HTTPException(status_code=400, detail=f"{e} ({len(results)} records before this were saved)" if results else str(e))
+    return summarize(results)
+
+@router.get("/agents/", response_model=List[AgentSchema])
+def read_agents(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return response_cache.respond(
+        request, db, ["agents"], List[AgentSchema], lambda: db.query(Agent).offset(skip).limit(limit).all()
+    )
 
 # Feedbacks
-@app.post("/feedbacks/", response_model=FeedbackSchema)
+@router.post("/feedbacks/", response_model=FeedbackSchema)
 def create_feedback(feedback: FeedbackCreate, db: Session = Depends(get_db)):
     db_feedback = Feedback(**feedback.dict())
     db.add(db_feedback)
+    db.flush()
+    rollups.record_feedback(db, db_feedback)
     db.commit()
     db.refresh(db_feedback)
+    publish_feedback_created(db, db_feedback)
     return db_feedback
 
-@app.get("/feedbacks/", response_model=List[FeedbackSchema])
-def read_feedbacks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    feedbacks = db.query(Feedback).offset(skip).limit(limit).all()
-    return feedbacks
+@router.get("/feedbacks/", response_model=List[FeedbackSchema])
+def read_feedbacks(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return response_cache.respond(
+        request, db, ["feedback"], List[FeedbackSchema], lambda: db.query(Feedback).offset(skip).limit(limit).all()
+    )
+
+@router.get("/feedbacks/enriched", response_model=FeedbackPage)
+def read_enriched_feedbacks(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    agent_id: Optional[int] = None,
+    sentiment: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    query = enriched_feedback_query(db, agent_id, sentiment, created_after, created_before)
+    if cursor:
+        try:
+            query = query.filter(after_cursor(Feedback.created_at, Feedback.id, cursor))
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def build():
+        # Fetch one extra row to know whether another page exists
+        feedbacks = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(feedbacks) > limit:
+            feedbacks = feedbacks[:limit]
+            next_cursor = encode_cursor(feedbacks[-1].created_at, feedbacks[-1].id)
+        return {"items": [enrich_feedback(f) for f in feedbacks], "next_cursor": next_cursor}
+
+    return response_cache.respond(request, db, ["feedback", "agents", "clients"], FeedbackPage, build)
+
+@router.get("/search", response_model=SearchResponse)
+def search(
+    q: str,
+    agent_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0,
+    db: Session = Depends(get_db)
+):
+    """Ranked full-text search over transcripts, summaries and action items ("phrases", OR, -exclude, prefix*)."""
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    try:
+        items = search_feedback(db, q, agent_id, created_after, created_before, limit=limit, offset=max(offset, 0))
+    except InvalidSearchQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"items": items}
+
+# Stats (served from rollup tables maintained on every feedback insert)
+@router.get("/stats/agents", response_model=List[AgentRating])
+def read_agent_stats(request: Request, db: Session = Depends(get_db)):
+    return response_cache.respond(request, db, ["feedback", "agents", "agent_stats"], List[AgentRating], lambda: rollups.agent_ratings(db))
+
+@router.get("/stats/sentiment", response_model=List[SentimentCount])
+def read_sentiment_stats(request: Request, db: Session = Depends(get_db)):
+    return response_cache.respond(request, db, ["feedback", "sentiment_stats"], List[SentimentCount], lambda: rollups.sentiment_counts(db))
+
+@router.get("/stats/action-items", response_model=List[ActionItemCount])
+def read_top_action_items(
+    request: Request,
+    days: int = 30,
+    agent_id: Optional[int] = None,
+    brokerage: Optional[str] = None,
+    group_by: Optional[str] = None,
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    """Most frequent action items in the last `days`; with group_by=agent|brokerage, the top `limit` per group."""
+    if days < 1 or days > 3660:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 3660")
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    if group_by not in (None, "agent", "brokerage"):
+        raise HTTPException(status_code=400, detail="group_by must be 'agent' or 'brokerage'")
+    # The window slides with the clock, so a cached answer is reused for at most a minute
+    minute = datetime.utcnow().replace(second=0, microsecond=0)
+    return response_cache.respond(
+        request, db, ["feedback", "agents"], List[ActionItemCount],
+        lambda: top_action_items(db, days=days, agent_id=agent_id, brokerage=brokerage, group_by=group_by, limit=limit),
+        extra_key=minute,
+    )
+
+@router.get("/stats/trends", response_model=List[AgentTrendBucket])
+def read_agent_trends(request: Request, agent_id: Optional[int] = None, days: int = 30, db: Session = Depends(get_db)):
+    if days < 1 or days > 366:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 366")
+    return response_cache.respond(
+        request, db, ["feedback", "agent_daily_stats"], List[AgentTrendBucket],
+        lambda: rollups.agent_trends(db, agent_id=agent_id, days=days),
+        extra_key=datetime.utcnow().date(),
+    )
 
 # Calls
-@app.post("/calls/", response_model=CallSchema)
+@router.post("/calls/", response_model=CallSchema)
 def create_call(call: CallCreate, db: Session = Depends(get_db)):
     db_call = Call(**call.dict())
     db.add(db_call)
@@ -115,138 +328,345 @@ def create_call(call: CallCreate, db: Session = Depends(get_db)):
     db.refresh(db_call)
     return db_call
 
-@app.get("/calls/", response_model=List[CallSchema])
+@router.get("/calls/", response_model=List[CallSchema])
 def read_calls(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     calls = db.query(Call).offset(skip).limit(limit).all()
     return calls
 
-@app.post("/test-call")
-async def test_call(phone_number: str = Form(...), db: Session = Depends(get_db)):
+# Bulk export
+def _export_response(kind: str, format: str, include_transcripts: bool, **filters):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    filename = f"{kind}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        export_stream(kind, format, include_transcripts=include_transcripts, **filters),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/export/feedback")
+def export_feedback(
+    format: str = "ndjson",
+    agent_id: Optional[int] = None,
+    sentiment: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_transcripts: bool = False,
+):
+    return _export_response("feedback", format, include_transcripts, agent_id=agent_id, sentiment=sentiment,
+                            created_after=created_after, created_before=created_before)
+
+@router.get("/export/calls")
+def export_calls(
+    format: str = "ndjson",
+    agent_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_transcripts: bool = False,
+):
+    return _export_response("calls", format, include_transcripts, agent_id=agent_id,
+                            created_after=created_after, created_before=created_before)
+
+# Campaigns
+@router.post("/campaigns/", response_model=CampaignProgress)
+def create_campaign(request: CampaignCreate, db: Session = Depends(get_db)):
+    if not request.targets:
+        raise HTTPException(status_code=400, detail="A campaign needs at least one target")
+    timezones = {request.timezone or settings.campaign_timezone} | {t.timezone for t in request.targets if t.timezone}
+    invalid = [tz for tz in timezones if not valid_timezone(tz)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone(s): {', '.join(sorted(invalid))}")
+    start = request.window_start_hour if request.window_start_hour is not None else settings.campaign_window_start_hour
+    end = request.window_end_hour if request.window_end_hour is not None else settings.campaign_window_end_hour
+    # Each target's effective window, with the campaign's hours filling in what it leaves out
+    windows = {(start, end)} | {
+        (t.window_start_hour if t.window_start_hour is not None else start, t.window_end_hour if t.window_end_hour is not None else end)
+        for t in request.targets
+    }
+    if any(not 0 <= window_start < window_end <= 24 for window_start, window_end in windows):
+        raise HTTPException(
+            status_code=400,
+            detail="Calling windows need a start hour of 0-23 before an end hour of 1-24 (overnight windows aren't supported)",
+        )
+
+    client_ids = {t.client_id for t in request.targets}
+    agent_ids = {t.agent_id for t in request.targets}
+    found_clients = {row[0] for row in db.query(Client.id).filter(Client.id.in_(client_ids))}
+    found_agents = {row[0] for row in db.query(Agent.id).filter(Agent.id.in_(agent_ids))}
+    if client_ids - found_clients or agent_ids - found_agents:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown client ids {sorted(client_ids - found_clients)} / agent ids {sorted(agent_ids - found_agents)}",
+        )
+
+    campaign = Campaign(
+        name=request.name,
+        timezone=request.timezone or settings.campaign_timezone,
+        window_start_hour=start,
+        window_end_hour=end,
+        max_attempts=request.max_attempts or settings.campaign_max_attempts,
+        retry_delay_minutes=request.retry_delay_minutes if request.retry_delay_minutes is not None else settings.campaign_retry_delay_minutes,
+    )
+    db.add(campaign)
+    db.flush()
+    db.bulk_save_objects([CampaignCall(campaign_id=campaign.id, **target.dict()) for target in request.targets])
+    db.commit()
+    dialer.notify()
+    return campaign_progress(db, campaign)
+
+@router.get("/campaigns/", response_model=List[CampaignProgress])
+def read_campaigns(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    campaigns = db.query(Campaign).order_by(Campaign.id.desc()).offset(skip).limit(limit).all()
+    return [campaign_progress(db, campaign) for campaign in campaigns]
+
+@router.get("/campaigns/{campaign_id}", response_model=CampaignProgress)
+def read_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign_progress(db, campaign)
+
+@router.post("/campaigns/{campaign_id}/{action}", response_model=CampaignProgress)
+def update_campaign_status(campaign_id: int, action: str, db: Session = Depends(get_db)):
+    transitions = {"pause": ("active", "paused"), "resume": ("paused", "active"), "cancel": (None, "cancelled")}
+    if action not in transitions:
+        raise HTTPException(status_code=404, detail="Unknown campaign action")
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    required, new_status = transitions[action]
+    if campaign.status in ("completed", "cancelled") or (required and campaign.status != required):
+        raise HTTPException(status_code=409, detail=f"Cannot {action} a {campaign.status} campaign")
+
+    campaign.status = new_status
+    if action == "cancel":
+        db.query(CampaignCall).filter(
+            CampaignCall.campaign_id == campaign.id, CampaignCall.status == "queued"
+        ).update({CampaignCall.status: "cancelled"}, synchronize_session=False)
+    db.commit()
+    dialer.notify()
+    return campaign_progress(db, campaign)
+
+@router.post("/call-status")
+def handle_call_status(
+    call_sid: Optional[str] = Form(None, alias="CallSid"),
+    call_status: Optional[str] = Form(None, alias="CallStatus"),
+    db: Session = Depends(get_db)
+):
+    # Sync so the blocking session work runs in the threadpool, not on the event loop
+    if call_sid and call_status:
+        if record_call_status(db, call_sid, call_status):
+            # A finished call frees a live-call slot
+            dialer.notify()
+        publish_call_status(call_sid, call_status)
+    return Response(status_code=204)
+
+@router.get("/events")
+async def stream_events(request: Request, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events: feedback.created, stats.updated, call.status, and resync when the client must refetch."""
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    async def stream():
+        queue = event_broker.subscribe(resume_from)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/test-call")
+async def test_call(phone_number: str = Form(...), db: AsyncSession = Depends(get_async_db)):
     try:
         # Validate and format phone number
         phone_number = phone_number.strip()
         if not phone_number.startswith('+'):
             # Assume US number if no country code
             phone_number = f'+1{phone_number}'
-        
-        print(f"Attempting to call: {phone_number}")
+        log.info("placing test call")
+        log.debug("test call number", extra={"fields": {"phone_number": phone_number}})
         
         # For testing, use the first agent in the database
-        agent = db.query(Agent).first()
+        agent = (await db.execute(select(Agent).limit(1))).scalar_one_or_none()
         if not agent:
             # Create a default agent if none exists
             agent = Agent(name="Test Agent", brokerage="Test Realty")
             db.add(agent)
-            db.commit()
-            db.refresh(agent)
+            await db.run_sync(rollups.bump_versions, "agents")
+            await db.commit()
         
         # Check if client already exists, otherwise create a test client
-        client = db.query(Client).filter(Client.phone == phone_number).first()
+        client = (await db.execute(select(Client).filter(Client.phone == phone_number).limit(1))).scalar_one_or_none()
         if not client:
             client = Client(name="Sara", phone=phone_number)
             db.add(client)
-            db.commit()
-            db.refresh(client)
+            await db.run_sync(rollups.bump_versions, "clients")
+            await db.commit()
         
         twiml = generate_twiml(client.name, agent.brokerage, agent.name)
         
-        print("Creating Twilio call...")
-        call = twilio_client.calls.create(
+        call_sid = await create_twilio_call(
             to=phone_number,
             from_=settings.twilio_phone_number,
-            twiml=twiml
+            twiml=twiml,
+            # Status changes are pushed to the dashboard over /events
+            status_callback=f"{settings.webhook_base_url}/call-status",
+            status_callback_event=["initiated", "ringing", "answered", "completed"],
+            status_callback_method="POST",
         )
         
         # Store the call in our database
         db_call = Call(
             client_id=client.id,
             agent_id=agent.id,
-            twilio_sid=call.sid
+            twilio_sid=call_sid
         )
         db.add(db_call)
-        db.commit()
+        await db.commit()
         
-        return {"call_sid": call.sid, "message": f"Test call initiated to {phone_number}"}
+        return {"call_sid": call_sid, "message": f"Test call initiated to {phone_number}"}
         
     except Exception as e:
-        print(f"Test call error: {e}")
-        db.rollback()
+        log.exception("test call error")
+        await db.rollback()
         return {"error": str(e), "message": "Failed to initiate call"}
 
-@app.post("/analyze")
+@router.post("/analyze")
 def analyze(request: AnalyzeRequest):
-    return analyze_feedback(request.transcript)
+    try:
+        return analyze_feedback(request.transcript)
+    except (CircuitOpenError, api_error()) as e:
+        raise HTTPException(status_code=503, detail=f"Analysis unavailable: {e}")
+
+@router.post("/analyze/batch", response_model=BatchAnalyzeResponse)
+def analyze_batch(request: BatchAnalyzeRequest):
+    if len(request.items) > 5000:
+        raise HTTPException(status_code=400, detail="At most 5000 transcripts per batch request")
+    ids = [item.id for item in request.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Item ids must be unique")
+    try:
+        results = analyze_feedback_batch([(item.id, item.transcript) for item in request.items])
+    except (CircuitOpenError, api_error()) as e:
+        raise HTTPException(status_code=503, detail=f"Analysis unavailable: {e}")
+    return {"results": [{"id": item_id, **results[item_id]} for item_id in ids]}
+
+@router.get("/llm/stats")
+def read_llm_stats():
+    return {"chat": chat_scheduler.stats(), "transcription": transcription_scheduler.stats()}
 
-@app.post("/webhook")
+@router.get("/analyze/stats")
+def read_local_analysis_stats():
+    return local_stats.stats()
+
+# Result cache
+@router.get("/cache/stats")
+def read_cache_stats():
+    return {"analysis": analysis_cache.stats(), "transcription": transcription_cache.stats(), "responses": response_cache.stats()}
+
+@router.post("/cache/invalidate")
+def invalidate_cache(kind: Optional[str] = None):
+    caches = {"analysis": analysis_cache, "transcription": transcription_cache, "responses": response_cache}
+    if kind is not None and kind not in caches:
+        raise HTTPException(status_code=400, detail="kind must be 'analysis', 'transcription' or 'responses'")
+    selected = [caches[kind]] if kind else list(caches.values())
+    return {"deleted": sum(cache.invalidate() for cache in selected)}
+
+@router.post("/webhook")
 async def handle_webhook(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Log all form data for debugging
         form_data = await request.form()
-        print(f"Webhook form data: {dict(form_data)}")
+        log.debug("webhook form data", extra={"fields": {"form": dict(form_data)}})
 
         recording_url = form_data.get("RecordingUrl")
         call_sid = form_data.get("CallSid")
 
-        print(f"Webhook received - CallSid: {call_sid}, RecordingUrl: {recording_url}")
+        log.info("webhook received", extra={"fields": {"call_sid": call_sid, "recording_url": recording_url}})
 
         if not recording_url or not call_sid:
-            print("Missing recording_url or call_sid")
+            log.warning("webhook missing RecordingUrl or CallSid")
+            webhook_deliveries.inc(result="invalid")
             response = VoiceResponse()
             response.hangup()
             return Response(content=str(response), media_type="application/xml")
 
-        # Transcribe the audio
-        transcript = transcribe_audio(recording_url)
-        print(f"Transcript: {transcript}")
-
-        if transcript.startswith("Error:"):
-            print(f"Transcription failed: {transcript}")
-            response = VoiceResponse()
-            response.hangup()
-            return Response(content=str(response), media_type="application/xml")
-
-        # Find the call in database
-        call = db.query(Call).filter(Call.twilio_sid == call_sid).first()
-        if not call:
-            print(f"Call not found for sid: {call_sid}")
-            response = VoiceResponse()
-            response.hangup()
-            return Response(content=str(response), media_type="application/xml")
-
-        # Update call with transcript
-        call.transcript = transcript
-        call.recording_url = recording_url
-
-        # Analyze the feedback
-        analysis = analyze_feedback(transcript)
-        print(f"Analysis: {analysis}")
-
-        # Create feedback record
-        feedback = Feedback(
-            client_id=call.client_id,
-            agent_id=call.agent_id,
-            call_id=call.id,
-            sentiment=analysis["overall_sentiment"],
-            rating=analysis["rating_estimate"],
-            summary=analysis["summary"],
-            action_items=json.dumps(analysis["action_items"])
-        )
-        db.add(feedback)
-        db.commit()
-
-        print("Feedback processed successfully")
+        # Transcription and analysis run in the job workers; only record the work here
+        recording_sid = form_data.get("RecordingSid") or recording_url.split('/')[-1]
+        recording_started_at = parse_recording_start_time(form_data.get("RecordingStartTime"))
+        job, created = await accept_recording_delivery(db, call_sid, recording_sid, recording_url, recording_started_at)
+        fields = {"job_id": job.id, "recording_sid": recording_sid}
+        if created:
+            worker_pool.notify()
+            webhook_deliveries.inc(result="accepted")
+            log.info("queued processing job", extra={"fields": fields})
+        else:
+            webhook_deliveries.inc(result="duplicate")
+            log.info("duplicate delivery attached to existing job", extra={"fields": {**fields, "status": job.status}})
         # Return empty TwiML to continue the call
         response = VoiceResponse()
         return Response(content=str(response), media_type="application/xml")
 
-    except Exception as e:
-        print(f"Webhook error: {e}")
-        import traceback
-        traceback.print_exc()
-        db.rollback()
+    except Exception:
+        log.exception("webhook error")
+        webhook_deliveries.inc(result="error")
+        await db.rollback()
         response = VoiceResponse()
         response.hangup()
-        return Response(content=str(response), media_type="application/xml")
\ No newline at end of file
+        return Response(content=str(response), media_type="application/xml")
+
+# Metrics
+def _job_counts():
+    db = SessionLocal()
+    try:
+        rows = db.query(ProcessingJob.kind, ProcessingJob.status, func.count(ProcessingJob.id)).filter(
+            ProcessingJob.status.in_(["queued", "running"])
+        ).group_by(ProcessingJob.kind, ProcessingJob.status).all()
+        return {(kind, status): count for kind, status, count in rows}
+    finally:
+        db.close()
+
+def _scheduler_gauge(field: str):
+    return lambda: {(s.name,): float(s.stats()[field]) for s in (chat_scheduler, transcription_scheduler)}
+
+registry.register(Gauge("jobs_pending", "Processing jobs waiting or running.", ("kind", "status"), collect=_job_counts))
+registry.register(Gauge("llm_in_flight", "OpenAI requests in flight.", ("scheduler",), collect=_scheduler_gauge("in_flight")))
+registry.register(Gauge("llm_queue_depth", "Callers waiting for OpenAI admission.", ("scheduler",), collect=_scheduler_gauge("queue_depth")))
+registry.register(Gauge("llm_circuit_open", "1 while the OpenAI circuit breaker is open.", ("scheduler",), collect=_scheduler_gauge("circuit_open")))
+registry.register(Gauge("events_subscribers", "Connected /events streams.", collect=lambda: {(): event_broker.stats()["subscribers"]}))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Processing jobs
+@router.get("/jobs/", response_model=List[ProcessingJobSchema])
+def read_jobs(status: Optional[str] = None, call_sid: Optional[str] = None, recording_sid: Optional[str] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    query = db.query(ProcessingJob)
+    if status:
+        query = query.filter(ProcessingJob.status == status)
+    if call_sid:
+        query = query.filter(ProcessingJob.call_sid == call_sid)
+    if recording_sid:
+        query = query.filter(ProcessingJob.recording_sid == recording_sid)
+    return query.order_by(ProcessingJob.id.desc()).offset(skip).limit(limit).all()
+
+@router.get("/jobs/{job_id}", response_model=ProcessingJobSchema)
+def read_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+app = create_app()
@@ -0,0 +1,208 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A deliberately small subset of prometheus_client: counters, gauges
+(set directly or computed at scrape time) and histograms, all thread-safe
+and labelled. stage_timer() wraps one pipeline stage. It records the
+stage's latency histogram and in-flight gauge, and logs a structured
+timing line carrying the current trace ID.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+from tracing import get_logger
+
+# Seconds; spans a local DB commit (~1 ms) to a slow Whisper upload or a backed-off GPT retry
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+log = get_logger("metrics")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), collect: Callable[[], dict] = None):
+        super().__init__(name, documentation, labelnames)
+        # collect() returns {label values tuple: value} and replaces the stored values at scrape time
+        self.collect = collect
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.collect is not None:
+            try:
+                collected = self.collect()
+            except Exception as e:
+                log.warning("gauge collection failed", extra={"fields": {"metric": self.name, "error": str(e)}})
+                collected = {}
+            with self._lock:
+                self._values = {tuple(str(v) for v in key): value for key, value in collected.items()}
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self, **labels):
+        """(cumulative bucket counts, sum, count) for one label set."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return [0] * len(self.buckets), 0.0, 0
+            counts = list(series[:len(self.buckets)])
+        for index in range(1, len(counts)):
+            counts[index] += counts[index - 1]
+        return counts, series[-2], series[-1]
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "pipeline_stage_seconds", "Latency of each pipeline stage.", ("stage", "outcome")))
+stage_in_flight = registry.register(Gauge(
+    "pipeline_stage_in_flight", "Pipeline stages currently executing.", ("stage",)))
+http_request_seconds = registry.register(Histogram(
+    "http_request_seconds", "HTTP request latency by route template.", ("method", "route", "status")))
+webhook_deliveries = registry.register(Counter(
+    "webhook_deliveries_total", "Recording callbacks by result (accepted, duplicate, invalid, error).", ("result",)))
+transcriptions = registry.register(Counter(
+    "transcriptions_total", "Recording transcriptions by result (ok, silent, cached, error).", ("result",)))
+analyses = registry.register(Counter(
+    "analyses_total", "Feedback analyses by source (local, cache, llm, fallback, error).", ("source",)))
+jobs_finished = registry.register(Counter(
+    "jobs_total", "Processing job attempts by kind and outcome (succeeded, retry, failed).", ("kind", "outcome")))
+feedback_lag_seconds = registry.register(Histogram(
+    "feedback_lag_seconds", "Time from a call's analysis job being queued to its feedback being committed.",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)))
+
+
+@contextmanager
+def stage_timer(stage: str, **fields):
+    """Time one pipeline stage; exceptions are recorded as outcome="error" and re-raised."""
+    stage_in_flight.inc(stage=stage)
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_in_flight.dec(stage=stage)
+        stage_seconds.observe(elapsed, stage=stage, outcome=outcome)
+        log.info("stage finished", extra={"fields": {
+            "stage": stage, "outcome": outcome, "duration_ms": round(elapsed * 1000, 2), **fields,
+        }})
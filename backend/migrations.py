@@ -0,0 +1,143 @@
+"""Schema changes for databases created by an older version of the app.
+
+Base.metadata.create_all() creates missing tables but never alters existing
+ones, so columns, indexes and constraints added to existing tables are
+applied here. Each migration runs once, in its own transaction, and is
+recorded in schema_migrations. On a fresh database create_all has already
+built everything and the migrations only get recorded.
+
+migrate() does both steps. Deploys run it explicitly with
+`python migrations.py`. Local runs can leave DB_AUTO_MIGRATE on so the
+app does it at startup.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("id", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class MigrationError(Exception):
+    """Raised when existing data prevents a migration from being applied."""
+
+
+def _add_column(connection: Connection, table: str, column: str, ddl_type: str):
+    existing = {c["name"] for c in inspect(connection).get_columns(table)}
+    if column not in existing:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_index(connection: Connection, name: str, table: str, columns: str, unique: bool = False):
+    # Same names create_all uses (ix_<table>_<column>), so fresh databases are a no-op
+    connection.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def processing_job_audio_savings(connection: Connection):
+    _add_column(connection, "processing_jobs", "audio_bytes_saved", "INTEGER")
+    _add_column(connection, "processing_jobs", "audio_seconds_saved", "FLOAT")
+
+
+def unique_call_twilio_sid(connection: Connection):
+    # Every recording webhook and status callback looks calls up by twilio_sid
+    duplicates = connection.execute(text(
+        "SELECT twilio_sid FROM calls WHERE twilio_sid IS NOT NULL GROUP BY twilio_sid HAVING COUNT(*) > 1"
+    )).scalars().all()
+    if duplicates:
+        raise MigrationError(f"Cannot make calls.twilio_sid unique, duplicated sids: {', '.join(duplicates[:10])}")
+    _create_index(connection, "ix_calls_twilio_sid", "calls", "twilio_sid", unique=True)
+
+
+def feedback_indexes(connection: Connection):
+    _create_index(connection, "ix_feedback_agent_id", "feedback", "agent_id")
+    _create_index(connection, "ix_feedback_created_at", "feedback", "created_at")
+    _create_index(connection, "ix_feedback_agent_id_created_at", "feedback", "agent_id, created_at")
+
+
+def processing_job_duplicate_deliveries(connection: Connection):
+    _add_column(connection, "processing_jobs", "duplicate_deliveries", "INTEGER DEFAULT 0")
+
+
+def processing_job_trace_id(connection: Connection):
+    _add_column(connection, "processing_jobs", "trace_id", "VARCHAR")
+
+
+def processing_job_lease_token(connection: Connection):
+    _add_column(connection, "processing_jobs", "lease_token", "VARCHAR")
+
+
+def call_export_indexes(connection: Connection):
+    _create_index(connection, "ix_calls_created_at", "calls", "created_at")
+    _create_index(connection, "ix_calls_agent_id_created_at", "calls", "agent_id, created_at")
+
+
+def feedback_search_index(connection: Connection):
+    from search import create_search_index
+
+    create_search_index(connection)
+
+
+def action_items_backfill(connection: Connection):
+    from action_items import backfill_action_items
+
+    backfill_action_items(connection)
+
+
+MIGRATIONS = [
+    ("0001_processing_job_audio_savings", processing_job_audio_savings),
+    ("0002_unique_call_twilio_sid", unique_call_twilio_sid),
+    ("0003_feedback_indexes", feedback_indexes),
+    ("0004_processing_job_duplicate_deliveries", processing_job_duplicate_deliveries),
+    ("0005_processing_job_trace_id", processing_job_trace_id),
+    ("0006_call_export_indexes", call_export_indexes),
+    ("0007_feedback_search_index", feedback_search_index),
+    ("0008_action_items_backfill", action_items_backfill),
+    ("0009_processing_job_lease_token", processing_job_lease_token),
+]
+
+
+def applied_migrations(engine: Engine) -> set:
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        return set(connection.execute(select(schema_migrations.c.id)).scalars())
+
+
+def pending_migrations(engine: Engine) -> list:
+    done = applied_migrations(engine)
+    return [migration_id for migration_id, _ in MIGRATIONS if migration_id not in done]
+
+
+def run_migrations(engine: Engine) -> list:
+    """Apply pending migrations in order; returns the ids that were applied."""
+    done = applied_migrations(engine)
+    applied = []
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in done:
+            continue
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(schema_migrations.insert().values(id=migration_id, applied_at=datetime.utcnow()))
+        applied.append(migration_id)
+    return applied
+
+
+def migrate(engine: Engine) -> list:
+    """Create missing tables, then apply pending migrations; returns the ids that were applied."""
+    from models import Base
+
+    Base.metadata.create_all(bind=engine)
+    return run_migrations(engine)
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    applied = migrate(engine)
+    for migration_id in applied:
+        print(f"Applied database migration {migration_id}")
+    print("Database schema is up to date" if not applied else f"Applied {len(applied)} migration(s)")
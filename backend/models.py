@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -26,30 +26,171 @@ class Agent(Base):
 
 class Call(Base):
     __tablename__ = "calls"
+    __table_args__ = (
+        # Exports filter on agent_id and a created_at range
+        Index("ix_calls_agent_id_created_at", "agent_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(Integer, ForeignKey("clients.id"))
     agent_id = Column(Integer, ForeignKey("agents.id"))
     recording_url = Column(String)
     transcript = Column(Text)
-    twilio_sid = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    twilio_sid = Column(String, unique=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     client = relationship("Client", back_populates="calls")
     agent = relationship("Agent", back_populates="calls")
 
 class Feedback(Base):
     __tablename__ = "feedback"
+    __table_args__ = (
+        # Per-agent listings filter on agent_id and page newest-first
+        Index("ix_feedback_agent_id_created_at", "agent_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(Integer, ForeignKey("clients.id"))
-    agent_id = Column(Integer, ForeignKey("agents.id"))
+    agent_id = Column(Integer, ForeignKey("agents.id"), index=True)
     call_id = Column(Integer, ForeignKey("calls.id"))
     sentiment = Column(String)
     rating = Column(Float)
     summary = Column(Text)
     action_items = Column(Text)  # JSON string
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     client = relationship("Client", back_populates="feedbacks")
-    agent = relationship("Agent", back_populates="feedbacks")
\ No newline at end of file
+    agent = relationship("Agent", back_populates="feedbacks")
+
+class ActionItem(Base):
+    """One action item of a Feedback row, with a key shared by near-identical phrasings (see action_items.py)."""
+    __tablename__ = "action_items"
+    __table_args__ = (
+        # Cover the top-N GROUP BYs: a time window, optionally for one agent, grouped by key
+        Index("ix_action_items_created_at_key", "created_at", "normalized_key"),
+        Index("ix_action_items_agent_id_created_at_key", "agent_id", "created_at", "normalized_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    feedback_id = Column(Integer, ForeignKey("feedback.id", ondelete="CASCADE"), index=True)
+    agent_id = Column(Integer, ForeignKey("agents.id"))
+    position = Column(Integer, default=0)
+    text = Column(Text)
+    normalized_key = Column(String(255))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, default="recording")  # recording: one answer, call: the whole conversation
+    dedupe_key = Column(String, unique=True, nullable=True)
+    call_sid = Column(String, index=True)
+    recording_sid = Column(String, index=True)
+    recording_url = Column(String)
+    recording_started_at = Column(DateTime, nullable=True)
+    trace_id = Column(String, nullable=True)  # trace of the webhook request that queued it
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, failed
+    lease_token = Column(String, nullable=True)  # set by each claim; only the worker holding it may commit results
+    stage = Column(String, default="download")  # download, transcribe, collect, analyze, persist, done
+    attempts = Column(Integer, default=0)
+    duplicate_deliveries = Column(Integer, default=0)  # Twilio retries of the same callback
+    last_error = Column(Text, nullable=True)
+    transcript = Column(Text, nullable=True)
+    analysis = Column(Text, nullable=True)  # JSON string
+    audio_bytes_saved = Column(Integer, nullable=True)
+    audio_seconds_saved = Column(Float, nullable=True)
+    feedback_id = Column(Integer, ForeignKey("feedback.id"), nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CallSegment(Base):
+    __tablename__ = "call_segments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    call_sid = Column(String, index=True)
+    recording_sid = Column(String, unique=True)
+    recording_url = Column(String)
+    transcript = Column(Text)
+    started_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class AgentStats(Base):
+    __tablename__ = "agent_stats"
+
+    agent_id = Column(Integer, ForeignKey("agents.id"), primary_key=True)
+    feedback_count = Column(Integer, default=0)
+    rated_count = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SentimentStats(Base):
+    __tablename__ = "sentiment_stats"
+
+    sentiment = Column(String, primary_key=True)
+    feedback_count = Column(Integer, default=0)
+
+class AgentDailyStats(Base):
+    __tablename__ = "agent_daily_stats"
+
+    agent_id = Column(Integer, ForeignKey("agents.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    feedback_count = Column(Integer, default=0)
+    rated_count = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0.0)
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, default=0)  # bumped in the same transaction as every write to the table
+
+class CachedResult(Base):
+    __tablename__ = "cached_results"
+
+    key = Column(String, primary_key=True)
+    kind = Column(String, index=True)  # analysis or transcription
+    version = Column(String)  # model and prompt version the value was produced with
+    value = Column(Text)  # JSON string
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True)
+
+class Campaign(Base):
+    __tablename__ = "campaigns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    status = Column(String, default="active", index=True)  # active, paused, cancelled, completed
+    timezone = Column(String)
+    window_start_hour = Column(Integer)  # local hour calls may start
+    window_end_hour = Column(Integer)  # local hour calls must stop
+    max_attempts = Column(Integer)
+    retry_delay_minutes = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    calls = relationship("CampaignCall", back_populates="campaign")
+
+class CampaignCall(Base):
+    __tablename__ = "campaign_calls"
+
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), index=True)
+    client_id = Column(Integer, ForeignKey("clients.id"))
+    agent_id = Column(Integer, ForeignKey("agents.id"))
+    # Per-client calling window; falls back to the campaign's when null
+    timezone = Column(String, nullable=True)
+    window_start_hour = Column(Integer, nullable=True)
+    window_end_hour = Column(Integer, nullable=True)
+    status = Column(String, default="queued", index=True)  # queued, dialing, in_progress, completed, failed, cancelled
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    call_sid = Column(String, nullable=True, index=True)
+    last_outcome = Column(String, nullable=True)  # Twilio CallStatus of the latest attempt
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    campaign = relationship("Campaign", back_populates="calls")
+    client = relationship("Client")
+    agent = relationship("Agent")
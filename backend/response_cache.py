@@ -0,0 +1,114 @@
+"""Conditional GET and a versioned cache for list and stats responses.
+
+Each cached endpoint names the tables its response is read from. Every
+write to those tables bumps the table's row in table_versions in the
+same transaction (rollups.bump_versions). The endpoint path, query
+parameters and table versions therefore identify one response. Its
+body is serialized once through the endpoint's response model and kept
+in an in-process LRU under that key. A repeat request then costs one
+primary-key read of table_versions, with no query and no serialization.
+
+The ETag is a hash of the body. It is strong, and it agrees across
+worker processes and restarts, so a stale cache entry can never produce
+a wrong 304. A request whose If-None-Match matches gets an empty 304.
+Responses carry Cache-Control: no-cache, so browsers keep the body and
+revalidate it on every fetch.
+"""
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Callable, Sequence
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import Response
+from cache import TTLCache
+from rollups import table_versions
+from config import settings
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def serialize(response_model, data) -> bytes:
+    """JSON body for `data` (ORM objects or dicts) exactly as FastAPI would render it through `response_model`."""
+    adapter = _adapter(response_model)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True), by_alias=True)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    def __init__(self):
+        self.memory = TTLCache(settings.response_cache_max_entries, settings.response_cache_ttl_seconds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def respond(
+        self,
+        request: Request,
+        db: Session,
+        tables: Sequence[str],
+        response_model,
+        build: Callable[[], object],
+        extra_key=None,
+    ) -> Response:
+        """Serve `build()` serialized through `response_model`, from the cache while `tables` are unchanged.
+
+        `extra_key` covers inputs other than the tables, e.g. the current day
+        for endpoints that look back over a window of days.
+        """
+        # Versions first: a write landing after this read makes the body newer than its key, never older
+        versions = table_versions(db, tuple(tables))
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())), versions, extra_key)
+        entry = self.memory.get(key) if settings.response_cache_enabled else None
+        if entry is None:
+            self._count("misses")
+            body = serialize(response_model, build())
+            entry = ('"' + hashlib.sha256(body).hexdigest()[:32] + '"', body)
+            if len(body) <= settings.response_cache_max_body_bytes:
+                self.memory.set(key, entry)
+        else:
+            self._count("hits")
+
+        etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self._count("not_modified")
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def invalidate(self) -> int:
+        count = len(self.memory)
+        self.memory.discard()
+        return count
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "kind": "responses",
+            "memory_entries": len(self.memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from models import AgentStats, SentimentStats, AgentDailyStats, TableVersion, Agent, Feedback
+from action_items import record_action_items
+
+
+def normalize_sentiment(sentiment) -> str:
+    return (sentiment or "Neutral").strip().capitalize() or "Neutral"
+
+
+def _increment(db: Session, model, keys: dict, increments: dict):
+    """Atomically add `increments` to the row identified by `keys`, creating it if needed."""
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in increments},
+        )
+        db.execute(stmt)
+        return
+
+    conditions = [table.c[name] == value for name, value in keys.items()]
+    updated = db.execute(
+        table.update().where(*conditions).values({name: table.c[name] + value for name, value in increments.items()})
+    )
+    if updated.rowcount == 0:
+        db.execute(insert(table).values(**keys, **increments))
+
+
+def bump_versions(db: Session, *table_names: str):
+    """Mark tables as changed for cached responses (see response_cache.py); call before committing the write."""
+    for table_name in table_names:
+        _increment(db, TableVersion, {"table_name": table_name}, {"version": 1})
+
+
+def table_versions(db: Session, table_names) -> tuple:
+    rows = dict(db.query(TableVersion.table_name, TableVersion.version).filter(TableVersion.table_name.in_(table_names)))
+    return tuple(rows.get(table_name, 0) for table_name in table_names)
+
+
+def record_feedback(db: Session, feedback: Feedback):
+    """Fold a newly added Feedback row into the rollup tables, the action item index and the feedback version.
+
+    Call this before committing the session that inserted the feedback so the
+    rollups and the row commit (or roll back) together.
+    """
+    rated = feedback.rating is not None
+    rating = float(feedback.rating) if rated else 0.0
+    created_at = feedback.created_at or datetime.utcnow()
+
+    if feedback.agent_id is not None:
+        _increment(db, AgentStats, {"agent_id": feedback.agent_id},
+                   {"feedback_count": 1, "rated_count": int(rated), "rating_sum": rating})
+        _increment(db, AgentDailyStats, {"agent_id": feedback.agent_id, "day": created_at.date()},
+                   {"feedback_count": 1, "rated_count": int(rated), "rating_sum": rating})
+    _increment(db, SentimentStats, {"sentiment": normalize_sentiment(feedback.sentiment)}, {"feedback_count": 1})
+    record_action_items(db, feedback)
+    bump_versions(db, "feedback")
+
+
+def rebuild_rollups(db: Session):
+    """Recompute every rollup table from the feedback table."""
+    agents, days, sentiments = {}, {}, {}
+    rows = db.query(Feedback.agent_id, Feedback.rating, Feedback.sentiment, Feedback.created_at).yield_per(1000)
+    for agent_id, rating, sentiment, created_at in rows:
+        sentiment = normalize_sentiment(sentiment)
+        sentiments[sentiment] = sentiments.get(sentiment, 0) + 1
+        if agent_id is None:
+            continue
+        day = (created_at or datetime.utcnow()).date()
+        for bucket in (agents.setdefault(agent_id, [0, 0, 0.0]), days.setdefault((agent_id, day), [0, 0, 0.0])):
+            bucket[0] += 1
+            if rating is not None:
+                bucket[1] += 1
+                bucket[2] += float(rating)
+
+    db.query(AgentStats).delete()
+    db.query(SentimentStats).delete()
+    db.query(AgentDailyStats).delete()
+    if agents:
+        db.execute(insert(AgentStats.__table__), [
+            {"agent_id": agent_id, "feedback_count": c, "rated_count": r, "rating_sum": s}
+            for agent_id, (c, r, s) in agents.items()
+        ])
+    if days:
+        db.execute(insert(AgentDailyStats.__table__), [
+            {"agent_id": agent_id, "day": day, "feedback_count": c, "rated_count": r, "rating_sum": s}
+            for (agent_id, day), (c, r, s) in days.items()
+        ])
+    if sentiments:
+        db.execute(insert(SentimentStats.__table__), [
+            {"sentiment": sentiment, "feedback_count": count} for sentiment, count in sentiments.items()
+        ])
+    bump_versions(db, "agent_stats", "sentiment_stats", "agent_daily_stats")
+    db.commit()
+
+
+def rollups_need_rebuild(db: Session) -> bool:
+    # Databases created before the rollup tables existed have feedback but no stats yet
+    return db.query(SentimentStats).first() is None and db.query(Feedback.id).first() is not None
+
+
+def _average(rating_sum, rated_count):
+    return round(rating_sum / rated_count, 2) if rated_count else None
+
+
+def _agent_rating(stats: AgentStats, agent: Agent) -> dict:
+    return {
+        "agent_id": agent.id,
+        "agent_name": agent.name,
+        "brokerage": agent.brokerage,
+        "feedback_count": stats.feedback_count,
+        "average_rating": _average(stats.rating_sum, stats.rated_count),
+    }
+
+
+def agent_ratings(db: Session):
+    rows = (
+        db.query(AgentStats, Agent)
+        .join(Agent, Agent.id == AgentStats.agent_id)
+        .order_by(Agent.name)
+        .all()
+    )
+    return [_agent_rating(stats, agent) for stats, agent in rows]
+
+
+def agent_rating(db: Session, agent_id: int):
+    row = (
+        db.query(AgentStats, Agent)
+        .join(Agent, Agent.id == AgentStats.agent_id)
+        .filter(AgentStats.agent_id == agent_id)
+        .first()
+    )
+    return _agent_rating(*row) if row else None
+
+
+def sentiment_counts(db: Session):
+    rows = db.query(SentimentStats).order_by(SentimentStats.sentiment).all()
+    return [{"sentiment": row.sentiment, "count": row.feedback_count} for row in rows if row.feedback_count]
+
+
+def agent_trends(db: Session, agent_id: int = None, days: int = 30):
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    query = db.query(AgentDailyStats).filter(AgentDailyStats.day >= since)
+    if agent_id is not None:
+        query = query.filter(AgentDailyStats.agent_id == agent_id)
+    rows = query.order_by(AgentDailyStats.agent_id, AgentDailyStats.day).all()
+    return [
+        {
+            "agent_id": row.agent_id,
+            "day": row.day,
+            "feedback_count": row.feedback_count,
+            "average_rating": _average(row.rating_sum, row.rated_count),
+        }
+        for row in rows
+    ]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from typing import Optional, List, Dict
+from datetime import datetime, date
 
 class ClientBase(BaseModel):
     name: str
@@ -74,4 +74,148 @@ class FeedbackSummary(BaseModel):
     action_items: List[str]
 
 class AnalyzeRequest(BaseModel):
-    transcript: str
\ No newline at end of file
+    transcript: str
+
+class BatchAnalyzeItem(BaseModel):
+    id: str
+    transcript: str
+
+class BatchAnalyzeRequest(BaseModel):
+    items: List[BatchAnalyzeItem]
+
+class BatchAnalyzeResult(BaseModel):
+    id: str
+    overall_sentiment: str
+    rating_estimate: float
+    summary: str
+    action_items: List[str]
+    error: Optional[str] = None  # set when this item couldn't be analyzed and holds the fallback
+
+class BatchAnalyzeResponse(BaseModel):
+    results: List[BatchAnalyzeResult]
+
+class ActionItemCount(BaseModel):
+    key: str
+    item: str
+    count: int
+    agent_count: int
+    agent_id: Optional[int] = None
+    agent_name: Optional[str] = None
+    brokerage: Optional[str] = None
+
+class SearchResult(BaseModel):
+    feedback_id: int
+    call_id: Optional[int] = None
+    agent_id: Optional[int] = None
+    agent_name: Optional[str] = None
+    client_id: Optional[int] = None
+    client_name: Optional[str] = None
+    sentiment: Optional[str] = None
+    rating: Optional[float] = None
+    summary: Optional[str] = None
+    created_at: datetime
+    score: float
+    snippet: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    items: List[SearchResult]
+
+class BulkRecordResult(BaseModel):
+    index: int
+    status: str  # created, updated, unchanged, duplicate, invalid
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkUpsertResponse(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    duplicate: int
+    invalid: int
+    results: List[BulkRecordResult]
+
+class ProcessingJob(BaseModel):
+    id: int
+    kind: str
+    call_sid: Optional[str] = None
+    recording_sid: Optional[str] = None
+    recording_url: Optional[str] = None
+    trace_id: Optional[str] = None
+    status: str
+    stage: str
+    attempts: int
+    duplicate_deliveries: int = 0
+    last_error: Optional[str] = None
+    transcript: Optional[str] = None
+    audio_bytes_saved: Optional[int] = None
+    audio_seconds_saved: Optional[float] = None
+    feedback_id: Optional[int] = None
+    next_attempt_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class AgentRating(BaseModel):
+    agent_id: int
+    agent_name: str
+    brokerage: Optional[str] = None
+    feedback_count: int
+    average_rating: Optional[float] = None
+
+class SentimentCount(BaseModel):
+    sentiment: str
+    count: int
+
+class AgentTrendBucket(BaseModel):
+    agent_id: int
+    day: date
+    feedback_count: int
+    average_rating: Optional[float] = None
+
+class EnrichedFeedback(BaseModel):
+    id: int
+    client_id: Optional[int] = None
+    agent_id: Optional[int] = None
+    call_id: Optional[int] = None
+    client_name: str
+    agent_name: str
+    sentiment: Optional[str] = None
+    rating: Optional[float] = None
+    summary: Optional[str] = None
+    action_items: List[str]
+    created_at: datetime
+
+class FeedbackPage(BaseModel):
+    items: List[EnrichedFeedback]
+    next_cursor: Optional[str] = None
+
+class CampaignTarget(BaseModel):
+    client_id: int
+    agent_id: int
+    timezone: Optional[str] = None
+    window_start_hour: Optional[int] = None
+    window_end_hour: Optional[int] = None
+
+class CampaignCreate(BaseModel):
+    name: str
+    targets: List[CampaignTarget]
+    timezone: Optional[str] = None
+    window_start_hour: Optional[int] = None
+    window_end_hour: Optional[int] = None
+    max_attempts: Optional[int] = None
+    retry_delay_minutes: Optional[float] = None
+
+class CampaignProgress(BaseModel):
+    id: int
+    name: str
+    status: str
+    timezone: str
+    window_start_hour: int
+    window_end_hour: int
+    max_attempts: int
+    total: int
+    counts: Dict[str, int]
+    created_at: datetime
+    completed_at: Optional[datetime] = None
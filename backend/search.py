@@ -0,0 +1,238 @@
+"""Full-text search over call transcripts, feedback summaries and action items.
+
+Each feedback row has one search document that combines its call's
+transcript, the summary and the action items. On SQLite the documents
+live in an FTS5 table, feedback_search, with rowid = feedback.id. On
+Postgres they live in a feedback_search table with a generated, weighted
+tsvector and a GIN index. Triggers on feedback and calls keep the
+documents in sync, so every write path is covered: job workers, the
+feedback endpoints and bulk loads. Migration 0007 creates the triggers
+and backfills existing rows.
+
+Queries use web-search syntax on both backends:
+- plain words must all match;
+- "quoted phrases" match in order;
+- OR between terms matches either;
+- -word excludes matches.
+Results are ranked: bm25 on SQLite, ts_rank_cd on Postgres. Summaries
+and action items weigh more than the transcript. Snippets mark matches
+with <mark>...</mark>; the text around them is not HTML-escaped.
+"""
+import re
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+
+class InvalidSearchQuery(ValueError):
+    pass
+
+
+class SearchUnavailable(RuntimeError):
+    pass
+
+
+# SQLite: action_items is a JSON array string; index the items, not the JSON punctuation
+_SQLITE_ITEMS = (
+    "CASE WHEN json_valid({0}) AND json_type({0}) = 'array' "
+    "THEN (SELECT group_concat(value, '; ') FROM json_each({0})) ELSE {0} END"
+)
+_SQLITE_DOCUMENT = (
+    "INSERT INTO feedback_search (rowid, transcript, summary, action_items) "
+    "VALUES (NEW.id, (SELECT transcript FROM calls WHERE id = NEW.call_id), NEW.summary, "
+    + _SQLITE_ITEMS.format("NEW.action_items") + ");"
+)
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS feedback_search USING fts5("
+    "transcript, summary, action_items, tokenize = 'porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS feedback_search_insert AFTER INSERT ON feedback BEGIN "
+    + _SQLITE_DOCUMENT + " END",
+    "CREATE TRIGGER IF NOT EXISTS feedback_search_update AFTER UPDATE OF summary, action_items, call_id ON feedback BEGIN "
+    "DELETE FROM feedback_search WHERE rowid = OLD.id; " + _SQLITE_DOCUMENT + " END",
+    "CREATE TRIGGER IF NOT EXISTS feedback_search_delete AFTER DELETE ON feedback BEGIN "
+    "DELETE FROM feedback_search WHERE rowid = OLD.id; END",
+    "CREATE TRIGGER IF NOT EXISTS calls_search_update AFTER UPDATE OF transcript ON calls BEGIN "
+    "UPDATE feedback_search SET transcript = NEW.transcript "
+    "WHERE rowid IN (SELECT id FROM feedback WHERE call_id = NEW.id); END",
+    "DELETE FROM feedback_search",
+    "INSERT INTO feedback_search (rowid, transcript, summary, action_items) "
+    "SELECT f.id, c.transcript, f.summary, " + _SQLITE_ITEMS.format("f.action_items") + " "
+    "FROM feedback f LEFT JOIN calls c ON c.id = f.call_id",
+]
+
+_POSTGRES_ITEMS = r"""regexp_replace(coalesce({0}, ''), '[\[\]"]', ' ', 'g')"""
+
+POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS feedback_search (
+        feedback_id INTEGER PRIMARY KEY REFERENCES feedback (id) ON DELETE CASCADE,
+        transcript TEXT,
+        summary TEXT,
+        action_items TEXT,
+        document tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(summary, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(action_items, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(transcript, '')), 'B')
+        ) STORED
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_feedback_search_document ON feedback_search USING GIN (document)",
+    """CREATE OR REPLACE FUNCTION feedback_search_sync() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO feedback_search (feedback_id, transcript, summary, action_items)
+        VALUES (NEW.id, (SELECT transcript FROM calls WHERE id = NEW.call_id), NEW.summary, """
+    + _POSTGRES_ITEMS.format("NEW.action_items") + """)
+        ON CONFLICT (feedback_id) DO UPDATE SET
+            transcript = EXCLUDED.transcript, summary = EXCLUDED.summary, action_items = EXCLUDED.action_items;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS feedback_search_sync ON feedback",
+    "CREATE TRIGGER feedback_search_sync AFTER INSERT OR UPDATE OF summary, action_items, call_id ON feedback "
+    "FOR EACH ROW EXECUTE FUNCTION feedback_search_sync()",
+    """CREATE OR REPLACE FUNCTION calls_search_sync() RETURNS trigger AS $$
+    BEGIN
+        UPDATE feedback_search SET transcript = NEW.transcript
+        WHERE feedback_id IN (SELECT id FROM feedback WHERE call_id = NEW.id);
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS calls_search_sync ON calls",
+    "CREATE TRIGGER calls_search_sync AFTER UPDATE OF transcript ON calls "
+    "FOR EACH ROW EXECUTE FUNCTION calls_search_sync()",
+    "INSERT INTO feedback_search (feedback_id, transcript, summary, action_items) "
+    "SELECT f.id, c.transcript, f.summary, " + _POSTGRES_ITEMS.format("f.action_items") + " "
+    "FROM feedback f LEFT JOIN calls c ON c.id = f.call_id "
+    "ON CONFLICT (feedback_id) DO NOTHING",
+]
+
+
+def create_search_index(connection: Connection):
+    """Create the search table and its sync triggers for this database, and index existing feedback."""
+    statements = {"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL}.get(connection.dialect.name)
+    if statements is None:
+        return
+    for statement in statements:
+        # exec_driver_sql: trigger bodies contain ':' and '$$' that text() would try to bind
+        connection.exec_driver_sql(statement)
+
+
+_TOKEN = re.compile(r'-?"[^"]*"?|\S+')
+
+
+def fts5_query(query: str) -> str:
+    """Translate web-search syntax into an FTS5 MATCH expression, quoting every term so user input can't inject operators."""
+    groups, current, excluded = [], [], []
+    for token in _TOKEN.findall(query):
+        if token == "OR":
+            if current:
+                groups.append(current)
+                current = []
+            continue
+        negate = token.startswith("-") and len(token) > 1
+        if negate:
+            token = token[1:]
+        prefix = token.endswith("*") and not token.startswith('"')
+        term = token.strip('"').rstrip("*").strip()
+        if not term:
+            continue
+        quoted = '"' + term.replace('"', '""') + '"' + ("*" if prefix else "")
+        (excluded if negate else current).append(quoted)
+    if current:
+        groups.append(current)
+    if not groups:
+        raise InvalidSearchQuery("Search query needs at least one word or phrase to match")
+    expression = " OR ".join("(" + " AND ".join(group) + ")" for group in groups)
+    if excluded:
+        expression = f"({expression}) NOT ({' OR '.join(excluded)})"
+    return expression
+
+
+_SELECT_FEEDBACK = """
+    f.id AS feedback_id, f.call_id, f.agent_id, a.name AS agent_name, f.client_id, c.name AS client_name,
+    f.sentiment, f.rating, f.summary, f.created_at
+"""
+_JOIN_NAMES = "LEFT JOIN agents a ON a.id = f.agent_id LEFT JOIN clients c ON c.id = f.client_id"
+
+
+def _filters(agent_id, created_after, created_before, params: dict) -> str:
+    clauses = []
+    if agent_id is not None:
+        clauses.append("f.agent_id = :agent_id")
+        params["agent_id"] = agent_id
+    if created_after is not None:
+        clauses.append("f.created_at >= :created_after")
+        params["created_after"] = created_after
+    if created_before is not None:
+        clauses.append("f.created_at < :created_before")
+        params["created_before"] = created_before
+    return "".join(f" AND {clause}" for clause in clauses)
+
+
+def search_feedback(
+    db: Session,
+    query: str,
+    agent_id: int = None,
+    created_after: datetime = None,
+    created_before: datetime = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[dict]:
+    dialect = db.get_bind().dialect.name
+    params = {"limit": limit, "offset": offset}
+    where = _filters(agent_id, created_after, created_before, params)
+    if dialect == "sqlite":
+        params["query"] = fts5_query(query)
+        # Column weights: transcript, summary, action_items. bm25() is lower-is-better, so negate it into a score
+        sql = f"""
+            SELECT {_SELECT_FEEDBACK},
+                   -bm25(feedback_search, 1.0, 2.0, 2.0) AS score,
+                   snippet(feedback_search, -1, '<mark>', '</mark>', '…', 16) AS snippet
+            FROM feedback_search
+            JOIN feedback f ON f.id = feedback_search.rowid
+            {_JOIN_NAMES}
+            WHERE feedback_search MATCH :query{where}
+            ORDER BY bm25(feedback_search, 1.0, 2.0, 2.0)
+            LIMIT :limit OFFSET :offset
+        """
+    elif dialect == "postgresql":
+        if not query.strip():
+            raise InvalidSearchQuery("Search query needs at least one word or phrase to match")
+        params["query"] = query
+        # Headlines are costly, so only build them for the page of results
+        sql = f"""
+            SELECT page.*, ts_headline(
+                'english', concat_ws(' … ', page.summary, s.action_items, s.transcript), page.tsq,
+                'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=24, MinWords=8, FragmentDelimiter=" … "'
+            ) AS snippet
+            FROM (
+                SELECT {_SELECT_FEEDBACK}, ts_rank_cd(s.document, q.tsq) AS score, q.tsq
+                FROM feedback_search s
+                CROSS JOIN websearch_to_tsquery('english', :query) AS q(tsq)
+                JOIN feedback f ON f.id = s.feedback_id
+                {_JOIN_NAMES}
+                WHERE s.document @@ q.tsq{where}
+                ORDER BY score DESC, f.id DESC
+                LIMIT :limit OFFSET :offset
+            ) page
+            JOIN feedback_search s ON s.feedback_id = page.feedback_id
+            ORDER BY page.score DESC, page.feedback_id DESC
+        """
+    else:
+        raise SearchUnavailable(f"Full-text search is not supported on {dialect}")
+
+    try:
+        rows = db.execute(text(sql), params).mappings().all()
+    except (OperationalError, ProgrammingError) as e:
+        if "no such table: feedback_search" in str(e) or "feedback_search\" does not exist" in str(e):
+            raise SearchUnavailable("Search index missing; run `python migrations.py`")
+        raise
+    results = []
+    for row in rows:
+        item = {key: value for key, value in row.items() if key != "tsq"}
+        item["score"] = round(float(item["score"]), 4)
+        if isinstance(item["created_at"], str):
+            item["created_at"] = datetime.fromisoformat(item["created_at"])
+        results.append(item)
+    return results
@@ -0,0 +1,46 @@
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import List
+
+from models import CallSegment
+
+# The questions asked by generate_twiml, in order. Each one is followed by a <Record>,
+# so a completed call produces one recording per question.
+FEEDBACK_QUESTIONS = [
+    "How was your experience working with {agent_name}?",
+    "What did you like most about the experience?",
+    "Is there anything that could have been better?",
+]
+
+RECORDINGS_PER_CALL = len(FEEDBACK_QUESTIONS)
+
+
+def parse_recording_start_time(value: str):
+    # Twilio sends RecordingStartTime as an RFC 2822 date, e.g. "Mon, 22 Aug 2011 20:58:45 +0000"
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    # Stored naive in UTC like created_at; a "-0000" offset parses naive and is already UTC
+    if parsed.tzinfo is None:
+        return parsed
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def order_segments(segments: List[CallSegment]) -> List[CallSegment]:
+    # Prefer the recording start time; fall back to arrival order when Twilio didn't send one
+    return sorted(segments, key=lambda s: (s.started_at is None, s.started_at or s.created_at, s.id))
+
+
+def combine_segments(segments: List[CallSegment], agent_name: str = "the agent") -> str:
+    lines = []
+    for index, segment in enumerate(order_segments(segments)):
+        if index < len(FEEDBACK_QUESTIONS):
+            question = FEEDBACK_QUESTIONS[index].format(agent_name=agent_name)
+        else:
+            question = "Additional comments"
+        answer = (segment.transcript or "").strip() or "(no answer)"
+        lines.append(f"Q: {question}\nA: {answer}")
+    return "\n\n".join(lines)
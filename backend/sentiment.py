@@ -0,0 +1,212 @@
+"""Local first-pass feedback analysis.
+
+Most answers are short and unambiguous ("it was great, thanks", silence),
+and don't need a GPT round trip. local_analysis scores them on the CPU
+with a sentiment lexicon and negation/intensifier handling. It returns
+the same dict shape as analyze_feedback plus a confidence in [0, 1].
+Transcripts below local_sentiment_confidence_threshold are escalated to
+the LLM, and the LLM's answer is compared with the local guess so the
+agreement rate shows what the threshold costs in accuracy.
+"""
+import math
+import random
+import re
+import threading
+from typing import List, NamedTuple
+
+from config import settings
+
+LEXICON = {
+    # positive
+    "amazing": 3.0, "awesome": 3.0, "excellent": 3.0, "exceptional": 3.0, "fantastic": 3.0,
+    "outstanding": 3.0, "perfect": 3.0, "phenomenal": 3.0, "superb": 3.0, "wonderful": 3.0,
+    "incredible": 3.0, "love": 3.0, "loved": 3.0, "best": 3.0, "brilliant": 3.0,
+    "great": 2.5, "recommend": 2.5, "recommended": 2.5, "thrilled": 2.5, "delighted": 2.5,
+    "good": 2.0, "happy": 2.0, "pleased": 2.0, "satisfied": 2.0, "helpful": 2.0,
+    "professional": 2.0, "responsive": 2.0, "knowledgeable": 2.0, "friendly": 2.0, "smooth": 2.0,
+    "easy": 1.5, "enjoyed": 2.0, "impressed": 2.0, "patient": 1.5, "attentive": 1.5,
+    "thank": 1.5, "thanks": 1.5, "grateful": 2.0, "appreciate": 1.5, "appreciated": 1.5,
+    "quick": 1.0, "fast": 1.0, "nice": 1.5, "kind": 1.5, "reliable": 1.5,
+    "fine": 0.5, "okay": 0.5, "ok": 0.5, "decent": 1.0, "fair": 0.5,
+    # negative
+    "terrible": -3.0, "horrible": -3.0, "awful": -3.0, "worst": -3.0, "disaster": -3.0,
+    "nightmare": -3.0, "hate": -3.0, "hated": -3.0, "unprofessional": -3.0, "rude": -3.0,
+    "bad": -2.5, "poor": -2.5, "disappointed": -2.5, "disappointing": -2.5, "frustrated": -2.5,
+    "frustrating": -2.5, "unhappy": -2.5, "useless": -2.5, "incompetent": -3.0, "dishonest": -3.0,
+    "slow": -1.5, "late": -1.5, "confusing": -1.5, "confused": -1.5, "stressful": -2.0,
+    "unresponsive": -2.5, "ignored": -2.0, "pushy": -2.0, "annoying": -2.0, "difficult": -1.5,
+    "problem": -1.5, "problems": -1.5, "issue": -1.0, "issues": -1.0, "mistake": -2.0,
+    "mistakes": -2.0, "delay": -1.5, "delays": -1.5, "delayed": -1.5, "lost": -1.5,
+    "worse": -2.0, "mediocre": -1.5, "meh": -1.0, "lacking": -1.5,
+}
+NEGATORS = {"not", "never", "no", "nothing", "none", "hardly", "barely", "isn't", "wasn't", "weren't",
+            "didn't", "don't", "doesn't", "couldn't", "wouldn't", "can't", "won't", "aren't"}
+INTENSIFIERS = {"very": 1.5, "really": 1.4, "so": 1.3, "extremely": 1.8, "super": 1.5, "incredibly": 1.7,
+                "absolutely": 1.6, "truly": 1.4, "quite": 1.2, "pretty": 1.1, "somewhat": 0.7, "slightly": 0.6}
+# Suggestions and contrast usually carry action items or mixed feelings the lexicon can't summarize
+ESCALATION_CUES = {"but", "however", "although", "though", "should", "wish", "need", "needed", "needs",
+                   "improve", "improvement", "suggest", "suggestion", "hope", "hoping", "expected", "except"}
+NEGATION_SCOPE = 3
+
+_TOKEN = re.compile(r"[a-z]+(?:'[a-z]+)?|[.,;:!?]")
+_CLAUSE_BREAK = {".", ",", ";", ":", "!", "?"}
+_NO_ANSWER = "(no answer)"
+
+
+class LocalAnalysis(NamedTuple):
+    analysis: dict
+    confidence: float
+
+
+def answer_text(transcript: str) -> str:
+    """Only the caller's words: drop combine_segments' "Q:" lines and empty-answer placeholders."""
+    lines = transcript.splitlines()
+    if not any(line.startswith("A: ") for line in lines):
+        return transcript.strip()
+    answers = [line[3:].strip() for line in lines if line.startswith("A: ")]
+    return " ".join(answer for answer in answers if answer and answer != _NO_ANSWER)
+
+
+def _score(tokens: List[str]):
+    positive = negative = 0.0
+    hits = cues = 0
+    for index, token in enumerate(tokens):
+        if token in ESCALATION_CUES:
+            cues += 1
+        valence = LEXICON.get(token)
+        if valence is None:
+            continue
+        hits += 1
+        # Look back within the clause for negators and intensifiers
+        for back in range(1, NEGATION_SCOPE + 1):
+            if index - back < 0 or tokens[index - back] in _CLAUSE_BREAK:
+                break
+            previous = tokens[index - back]
+            if previous in NEGATORS:
+                # "not bad" is mildly positive, not as positive as "bad" is negative
+                valence *= -0.6
+                break
+            valence *= INTENSIFIERS.get(previous, 1.0)
+        if valence > 0:
+            positive += valence
+        else:
+            negative -= valence
+    return positive, negative, hits, cues
+
+
+def _sentiment(score: float) -> str:
+    if score >= 0.5:
+        return "Positive"
+    if score <= -0.5:
+        return "Negative"
+    return "Neutral"
+
+
+def local_analysis(transcript: str) -> LocalAnalysis:
+    text = answer_text(transcript or "")
+    tokens = _TOKEN.findall(text.lower())
+    words = [token for token in tokens if token not in _CLAUSE_BREAK]
+    if not words:
+        # Nothing was said; there is nothing for the LLM to find either
+        return LocalAnalysis({
+            "overall_sentiment": "Neutral",
+            "rating_estimate": 5,
+            "summary": "The client did not give any feedback.",
+            "action_items": [],
+        }, 1.0)
+
+    positive, negative, hits, cues = _score(tokens)
+    score = (positive - negative) / math.sqrt(hits) if hits else 0.0
+    sentiment = _sentiment(score)
+    rating = int(min(10, max(1, round(5 + 5 * math.tanh(score / 2.5)))))
+
+    polarity = abs(positive - negative) / (positive + negative) if hits else 0.0
+    coverage = min(1.0, hits / 2)
+    brevity = min(1.0, settings.local_sentiment_max_words / len(words))
+    confidence = polarity * coverage * brevity * (0.5 ** cues)
+
+    quote = text if len(text) <= 160 else text[:157].rstrip() + "..."
+    return LocalAnalysis({
+        "overall_sentiment": sentiment,
+        "rating_estimate": rating,
+        "summary": f'The client gave {sentiment.lower()} feedback: "{quote}"',
+        "action_items": [],
+    }, round(confidence, 4))
+
+
+def local_analysis_batch(transcripts: List[str]) -> List[LocalAnalysis]:
+    return [local_analysis(transcript) for transcript in transcripts]
+
+
+class LocalAnalysisStats:
+    """Counts how often the fast path answered, and how often it agreed with the LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.scored = 0
+            self.answered_locally = 0
+            self.escalated = 0
+            self.compared = 0
+            self.sentiment_agreed = 0
+            self.rating_error_sum = 0.0
+            # Per confidence decile, so the threshold can be tuned from real traffic
+            self.bands = [[0, 0] for _ in range(10)]
+
+    def record_decision(self, escalated: bool):
+        with self._lock:
+            self.scored += 1
+            if escalated:
+                self.escalated += 1
+            else:
+                self.answered_locally += 1
+
+    def record_comparison(self, local: LocalAnalysis, llm_result: dict):
+        agreed = local.analysis["overall_sentiment"].lower() == str(llm_result.get("overall_sentiment", "")).lower()
+        rating = llm_result.get("rating_estimate")
+        with self._lock:
+            self.compared += 1
+            self.sentiment_agreed += agreed
+            if isinstance(rating, (int, float)):
+                self.rating_error_sum += abs(local.analysis["rating_estimate"] - rating)
+            band = self.bands[min(9, int(local.confidence * 10))]
+            band[0] += 1
+            band[1] += agreed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": settings.local_sentiment_enabled,
+                "confidence_threshold": settings.local_sentiment_confidence_threshold,
+                "scored": self.scored,
+                "answered_locally": self.answered_locally,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / self.scored, 4) if self.scored else None,
+                "compared_with_llm": self.compared,
+                "sentiment_agreement": round(self.sentiment_agreed / self.compared, 4) if self.compared else None,
+                "mean_rating_error": round(self.rating_error_sum / self.compared, 3) if self.compared else None,
+                "agreement_by_confidence": [
+                    {"confidence": f"{i / 10:.1f}-{(i + 1) / 10:.1f}", "compared": total, "agreement": round(agreed / total, 4)}
+                    for i, (total, agreed) in enumerate(self.bands) if total
+                ],
+            }
+
+
+local_stats = LocalAnalysisStats()
+
+
+def needs_llm(local: LocalAnalysis) -> bool:
+    """Decide whether to escalate, recording the decision in local_stats.
+
+    Confident results are still escalated for a shadow_rate sample, so
+    agreement is also measured above the threshold.
+    """
+    escalate = (
+        local.confidence < settings.local_sentiment_confidence_threshold
+        or random.random() < settings.local_sentiment_shadow_rate
+    )
+    local_stats.record_decision(escalate)
+    return escalate
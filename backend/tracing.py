@@ -0,0 +1,74 @@
+"""Trace IDs and structured logging.
+
+Every HTTP request runs under a trace ID, taken from the caller's
+X-Request-ID header or generated, and echoed back in the response. A
+recording job stores the trace ID of the webhook that queued it, and the
+worker restores it while running the job. So one ID follows a recording
+from Twilio's callback through download, Whisper, GPT and the DB commit.
+Loggers from get_logger() stamp the current trace ID on every line.
+"""
+import contextvars
+import json
+import logging
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from config import settings
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: str = None):
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+            "trace_id": current_trace_id(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in (getattr(record, "fields", None) or {}).items())
+        line = f"[{current_trace_id() or '-'}] {record.getMessage()}" + (f" {fields}" if fields else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging():
+    logger = logging.getLogger("realtor")
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if settings.log_format == "json" else TextFormatter())
+    logger.handlers = [handler]
+    logger.setLevel(settings.log_level.upper())
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"realtor.{name}")
@@ -0,0 +1,18 @@
+from twilio.twiml.voice_response import VoiceResponse
+from segments import FEEDBACK_QUESTIONS
+from config import settings
+
+def generate_twiml(client_name, brokerage, agent_name):
+    response = VoiceResponse()
+    response.say("This call may be recorded and analyzed for quality purposes.")
+    for index, question in enumerate(FEEDBACK_QUESTIONS):
+        question = question.format(agent_name=agent_name)
+        if index == 0:
+            response.say(f"Hi {client_name}, this is an automated follow-up from {brokerage}. {question}")
+        else:
+            response.say("Thank you for your feedback.")
+            response.say(question)
+        response.record(timeout=5, playBeep=True, recordingStatusCallback=f'{settings.webhook_base_url}/webhook', recordingStatusCallbackMethod='POST')
+    response.say("Thank you so much for your time and valuable feedback. We really appreciate you sharing your experience with us. Have a great day!")
+    response.hangup()
+    return str(response)
@@ -1,7 +1,31 @@
 'use client';
 
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, PieChart, Pie, Cell } from 'recharts';
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
+
+const FEEDBACK_PAGE_SIZE = 50;
+
+const SENTIMENT_COLORS: { [key: string]: string } = {
+  'Positive': '#00C49F',
+  'Neutral': '#FFBB28',
+  'Negative': '#FF8042'
+};
+
+const toAgentRatings = (agentStats: any[]) =>
+  agentStats
+    .filter((stats: any) => stats.average_rating != null)
+    .map((stats: any) => ({
+      agentId: stats.agent_id,
+      name: stats.agent_name,
+      rating: stats.average_rating
+    }));
+
+const toSentimentData = (sentimentCounts: any[]) =>
+  sentimentCounts.map(({ sentiment, count }: any) => ({
+    name: sentiment,
+    value: count,
+    color: SENTIMENT_COLORS[sentiment] || '#999999'
+  }));
 
 export default function Dashboard() {
   const [phoneNumber, setPhoneNumber] = useState('');
@@ -11,74 +35,77 @@ export default function Dashboard() {
   const [agentRatings, setAgentRatings] = useState<any[]>([]);
   const [sentimentData, setSentimentData] = useState<any[]>([]);
   const [isLoading, setIsLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+
+  // Read inside the long-lived EventSource handlers, so a ref rather than state
+  const activeCallSid = useRef<string | null>(null);
 
   useEffect(() => {
     fetchFeedbackData();
   }, []);
 
+  // Apply backend changes as they are committed instead of refetching whole tables
+  useEffect(() => {
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000';
+    const events = new EventSource(`${apiUrl}/events`);
+
+    events.addEventListener('feedback.created', (event) => {
+      const feedback = JSON.parse((event as MessageEvent).data);
+      setFeedbackData((current) =>
+        current.some((item) => item.id === feedback.id) ? current : [feedback, ...current]
+      );
+    });
+
+    events.addEventListener('stats.updated', (event) => {
+      const { agent, sentiment } = JSON.parse((event as MessageEvent).data);
+      if (agent && agent.average_rating != null) {
+        const [rating] = toAgentRatings([agent]);
+        setAgentRatings((current) =>
+          current.some((item) => item.agentId === rating.agentId)
+            ? current.map((item) => (item.agentId === rating.agentId ? rating : item))
+            : [...current, rating].sort((a, b) => a.name.localeCompare(b.name))
+        );
+      }
+      setSentimentData(toSentimentData(sentiment));
+    });
+
+    events.addEventListener('call.status', (event) => {
+      const { call_sid, status } = JSON.parse((event as MessageEvent).data);
+      if (activeCallSid.current !== call_sid) return;
+      setCallStatus(
+        status === 'completed'
+          ? `Call ${call_sid} completed, feedback will appear once it is analyzed`
+          : `Call ${call_sid}: ${status}`
+      );
+    });
+
+    // Sent when this client missed events it can't replay; fall back to a full fetch
+    events.addEventListener('resync', () => {
+      fetchFeedbackData();
+    });
+
+    return () => events.close();
+  }, []);
+
   const fetchFeedbackData = async () => {
     try {
       const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000';
-      const response = await fetch(`${apiUrl}/feedbacks/`);
-      const feedbacks = await response.json();
+      // Feedback arrives with client/agent names and parsed action items already joined in
+      const response = await fetch(`${apiUrl}/feedbacks/enriched?limit=${FEEDBACK_PAGE_SIZE}`);
+      const page = await response.json();
+      setFeedbackData(page.items);
+      setNextCursor(page.next_cursor);
       
-      // Fetch clients and agents to join the data
-      const clientsResponse = await fetch(`${apiUrl}/clients/`);
-      const clients = await clientsResponse.json();
+      // Agent ratings and sentiment counts come pre-aggregated from the stats rollups
+      const agentStatsResponse = await fetch(`${apiUrl}/stats/agents`);
+      const agentStats = await agentStatsResponse.json();
       
-      const agentsResponse = await fetch(`${apiUrl}/agents/`);
-      const agents = await agentsResponse.json();
-      
-      // Join feedback with client and agent names
-      const enrichedFeedback = feedbacks.map((feedback: any) => {
-        const client = clients.find((c: any) => c.id === feedback.client_id);
-        const agent = agents.find((a: any) => a.id === feedback.agent_id);
-        return {
-          ...feedback,
-          client_name: client?.name || 'Unknown',
-          agent_name: agent?.name || 'Unknown',
-          action_items: feedback.action_items ? JSON.parse(feedback.action_items) : []
-        };
-      });
+      setAgentRatings(toAgentRatings(agentStats));
       
-      setFeedbackData(enrichedFeedback);
-      
-      // Calculate agent ratings
-      const agentRatingMap = new Map<number, { name: string, total: number, count: number }>();
-      enrichedFeedback.forEach((feedback: any) => {
-        if (feedback.rating != null && feedback.agent_id) {
-          const existing = agentRatingMap.get(feedback.agent_id) || { name: feedback.agent_name, total: 0, count: 0 };
-          existing.total += feedback.rating;
-          existing.count += 1;
-          agentRatingMap.set(feedback.agent_id, existing);
-        }
-      });
-      
-      const ratings = Array.from(agentRatingMap.values()).map(({ name, total, count }) => ({
-        name,
-        rating: Number((total / count).toFixed(2))
-      }));
-      setAgentRatings(ratings);
-      
-      // Calculate sentiment distribution
-      const sentimentMap = new Map<string, number>();
-      enrichedFeedback.forEach((feedback: any) => {
-        const sentiment = feedback.sentiment || 'Neutral';
-        sentimentMap.set(sentiment, (sentimentMap.get(sentiment) || 0) + 1);
-      });
-      
-      const sentimentColors: { [key: string]: string } = {
-        'Positive': '#00C49F',
-        'Neutral': '#FFBB28',
-        'Negative': '#FF8042'
-      };
-      
-      const sentiments = Array.from(sentimentMap.entries()).map(([name, value]) => ({
-        name,
-        value,
-        color: sentimentColors[name] || '#999999'
-      }));
-      setSentimentData(sentiments);
+      const sentimentResponse = await fetch(`${apiUrl}/stats/sentiment`);
+      const sentimentCounts = await sentimentResponse.json();
+      setSentimentData(toSentimentData(sentimentCounts));
       
       setIsLoading(false);
     } catch (error) {
@@ -87,6 +114,23 @@ export default function Dashboard() {
     }
   };
 
+  const loadMoreFeedback = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000';
+      const params = new URLSearchParams({ limit: String(FEEDBACK_PAGE_SIZE), cursor: nextCursor });
+      const response = await fetch(`${apiUrl}/feedbacks/enriched?${params}`);
+      const page = await response.json();
+      setFeedbackData((current) => [...current, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error loading more feedback:', error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleTestCall = async () => {
     if (!phoneNumber.trim()) {
       setCallStatus('Please enter a phone number');
@@ -112,10 +156,8 @@ export default function Dashboard() {
       
       if (response.ok) {
         setCallStatus(`Call initiated! SID: ${data.call_sid}`);
-        // Refresh feedback data after a delay to allow time for the call to complete
-        setTimeout(() => {
-          fetchFeedbackData();
-        }, 30000); // Refresh after 30 seconds
+        // Progress and the resulting feedback arrive over /events
+        activeCallSid.current = data.call_sid;
       } else {
         setCallStatus(`Error: ${data.detail || 'Failed to initiate call'}`);
       }
@@ -183,8 +225,8 @@ export default function Dashboard() {
             <h2 className="text-xl font-semibold mb-4 text-black">Client Feedback</h2>
             {feedbackData.length > 0 ? (
               <div className="space-y-4">
-                {feedbackData.map((feedback, index) => (
-                  <div key={index} className="border p-4 rounded bg-gray-50">
+                {feedbackData.map((feedback) => (
+                  <div key={feedback.id} className="border p-4 rounded bg-gray-50">
                     <h3 className="font-semibold text-black">{feedback.client_name} - {feedback.agent_name}</h3>
                     <p className="text-sm text-black">
                       Sentiment: {feedback.sentiment} 
@@ -200,6 +242,15 @@ export default function Dashboard() {
                     )}
                   </div>
                 ))}
+                {nextCursor && (
+                  <button
+                    onClick={loadMoreFeedback}
+                    disabled={isLoadingMore}
+                    className="bg-gray-100 text-black px-6 py-2 rounded border hover:bg-gray-200 disabled:cursor-not-allowed"
+                  >
+                    {isLoadingMore ? 'Loading...' : 'Load more feedback'}
+                  </button>
+                )}
               </div>
             ) : (
               <p className="text-black">No feedback data available yet. Make a test call to see results here!</p>